@@ -0,0 +1,348 @@
+"""
+End-to-end benchmark of the agent loop, fully offline.
+
+A scripted LLM (configurable latency, jitter and output size) drives Agent through a fixed number of tool
+steps per conversation, against either local Python tools ("local") or the filesystem MCP server in server.py
+serving a synthetic file tree ("mcp", needs the mcp package). Every concurrency level reports:
+
+    conversations/s, p50/p99 step latency (one agent loop iteration: model call, parsing, tools),
+    p99/max event-loop lag, and memory retained per session (tracemalloc, separate pass).
+
+Results are saved to benchmarks/results/<time>-<commit>.json and compared with the previous run
+(or --compare FILE), so regressions show up between commits.
+
+Usage:
+    python -m benchmarks.bench_agent [--scenarios local,mcp] [--concurrency 1,10,100] [--conversations 200]
+                                     [--llm-latency 0.02] [--output-bytes 2000] [--steps 3]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pocket_agent.agent import Agent
+from pocket_agent.llm import LLM
+from pocket_agent.session import AgentSession
+from pocket_agent.tracing import Tracer
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+# metric -> True when higher is better
+METRICS = {
+    "conversations_per_s": True,
+    "step_p50_ms": False,
+    "step_p99_ms": False,
+    "loop_lag_p99_ms": False,
+    "loop_lag_max_ms": False,
+    "memory_per_session_kb": False,
+}
+
+
+class ScriptedLLM(LLM):
+    """
+    Answers each conversation with `steps` action turns followed by an output turn.
+    Every response starts with a plan step padded to output_bytes, so parsing cost scales with output size.
+    Also records step latency: the time between consecutive model calls of the same conversation (task).
+    """
+    model = "scripted"
+
+    def __init__(self, actions, steps=3, latency=0.0, jitter=0.0, output_bytes=0, seed=0):
+        self.actions = actions
+        self.steps = steps
+        self.latency = latency
+        self.jitter = jitter
+        self.output_bytes = output_bytes
+        self.random = random.Random(seed)
+        self.step_latencies = []
+        self._last_call = {}
+
+    def _mark(self):
+        task = asyncio.current_task()
+        now = time.perf_counter()
+        if task in self._last_call:
+            self.step_latencies.append(now - self._last_call[task])
+        self._last_call[task] = now
+
+    def finish(self):
+        """Close the last step of the conversation running in the current task."""
+        self._mark()
+        self._last_call.pop(asyncio.current_task(), None)
+
+    def _response(self, content):
+        done = sum(1 for m in content if m["content"].startswith('{"type": "observation"'))
+        plan = json.dumps({"type": "plan", "plan": "x" * self.output_bytes})
+        if done >= self.steps:
+            return plan + "\n" + json.dumps({"type": "output", "output": f"done after {done} steps"})
+        function, arguments = self.actions[done % len(self.actions)](self.random)
+        return plan + "\n" + json.dumps({"type": "action", "function": function, "input": arguments})
+
+    async def agenerate_response(self, system_instruction, content):
+        self._mark()
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._response(content)
+
+
+# --- scenarios --------------------------------------------------------------------------------------------
+
+def _local_actions(tool_latency):
+    table = {f"key{i}": i * i for i in range(1000)}
+
+    def lookup(key: str):
+        """Look up a key in an in-memory table."""
+        return table.get(key)
+
+    async def fetch(n: int):
+        """Simulated I/O-bound tool."""
+        await asyncio.sleep(tool_latency)
+        return {"n": n, "items": list(range(n))}
+
+    actions = [
+        lambda r: ("lookup", {"key": f"key{r.randrange(1000)}"}),
+        lambda r: ("fetch", {"n": r.randrange(1, 50)}),
+    ]
+    return [lookup, fetch], actions
+
+
+def make_tree(root: Path, files=500, dirs=20, lines=200, seed=0):
+    """Synthetic source tree: `files` text files spread over `dirs` directories."""
+    r = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "delta", "agent", "tool", "index", "stream", "cache", "token"]
+    for i in range(files):
+        path = root / f"dir{i % dirs}" / f"file{i}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("\n".join(" ".join(r.choice(words) for _ in range(10)) for _ in range(lines)), encoding="utf-8")
+
+
+def _mcp_actions(files, dirs):
+    return [
+        lambda r: ("read_file", {"path": f"dir{(i := r.randrange(files)) % dirs}/file{i}.txt", "max_bytes": 4000}),
+        lambda r: ("grep", {"query": r.choice(["alpha", "token", "stream"]), "page_size": 5}),
+        lambda r: ("read_lines", {"path": f"dir{(i := r.randrange(files)) % dirs}/file{i}.txt", "start_line": 50, "num_lines": 20}),
+    ]
+
+
+async def _build(scenario, args, stack):
+    """Agent and scripted LLM for a scenario. Cleanup callbacks are appended to stack."""
+    if scenario == "local":
+        tools, actions = _local_actions(args.tool_latency)
+    elif scenario == "mcp":
+        from pocket_agent.mcp_client import MCPClient
+
+        tree = tempfile.TemporaryDirectory(prefix="pocket_bench_")
+        stack.append(tree.cleanup)
+        make_tree(Path(tree.name), args.files, args.dirs)
+        os.environ["MCP_FS_ROOT"] = tree.name  # inherited by the spawned server
+
+        client = MCPClient(cache_dir=tempfile.mkdtemp(prefix="pocket_bench_cache_"))
+        await client.connect(str(ROOT / "server.py"))
+        stack.append(client.close)
+        tools, actions = [], _mcp_actions(args.files, args.dirs)
+    else:
+        raise ValueError(f"Unknown scenario {scenario!r}")
+
+    llm = ScriptedLLM(actions, args.steps, args.llm_latency, args.jitter, args.output_bytes, args.seed)
+    agent = Agent(llm, tracer=Tracer(exporters=[]), parallel_tools=True)
+    for tool in tools:
+        # lookup is a dict access: run it inline rather than paying for a thread hop
+        agent.register_tool(tool, mode="inline")
+    if scenario == "mcp":
+        agent.register_mcp(client)
+    return agent, llm
+
+
+# --- measurement ------------------------------------------------------------------------------------------
+
+async def _monitor_lag(samples, stop, interval=0.001):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - start - interval))
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _conversation(agent, llm, i, session=None):
+    output = await agent.ainvoke(f"benchmark conversation {i}", session=session)
+    llm.finish()
+    if output is None:
+        raise RuntimeError(f"Conversation {i} did not produce an output")
+
+
+async def _run_level(agent, llm, conversations, concurrency):
+    llm.step_latencies.clear()
+    limit = asyncio.Semaphore(concurrency)
+    lag, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(_monitor_lag(lag, stop))
+
+    async def one(i):
+        async with limit:
+            await _conversation(agent, llm, i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(conversations)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    return {
+        "conversations_per_s": conversations / elapsed,
+        "step_p50_ms": statistics.median(llm.step_latencies) * 1000,
+        "step_p99_ms": _percentile(llm.step_latencies, 0.99) * 1000,
+        "loop_lag_p99_ms": _percentile(lag, 0.99) * 1000,
+        "loop_lag_max_ms": max(lag, default=0.0) * 1000,
+    }
+
+
+async def _memory_per_session(agent, llm, sessions, concurrency):
+    """Bytes retained per finished conversation kept as an AgentSession (history included)."""
+    limit = asyncio.Semaphore(concurrency)
+    kept = [AgentSession(f"s{i}") for i in range(sessions)]
+
+    async def one(i):
+        async with limit:
+            await _conversation(agent, llm, i, kept[i])
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return retained / sessions / 1024
+
+
+async def run_scenario(scenario, args):
+    stack = []
+    try:
+        agent, llm = await _build(scenario, args, stack)
+        await _run_level(agent, llm, min(args.conversations, 10), 10)  # warm-up
+        rows = []
+        for concurrency in args.concurrency:
+            row = await _run_level(agent, llm, args.conversations, concurrency)
+            row["memory_per_session_kb"] = await _memory_per_session(agent, llm, args.memory_sessions, concurrency)
+            rows.append({"scenario": scenario, "concurrency": concurrency, **row})
+        return rows
+    finally:
+        for cleanup in reversed(stack):
+            result = cleanup()
+            if asyncio.iscoroutine(result):
+                await result
+
+
+# --- results ----------------------------------------------------------------------------------------------
+
+def _commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save(rows, args):
+    RESULTS_DIR.mkdir(exist_ok=True)
+    commit = _commit()
+    path = RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json"
+    meta = {"commit": commit, "time": time.time(), "python": platform.python_version(), "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("compare", "fail_on_regression")}}
+    path.write_text(json.dumps({"meta": meta, "results": rows}, indent=2), encoding="utf-8")
+    return path
+
+
+def _previous(current):
+    runs = sorted(p for p in RESULTS_DIR.glob("*.json") if p != current)
+    return runs[-1] if runs else None
+
+
+def compare(rows, baseline_path, threshold):
+    """Print relative changes against a baseline run. Returns the list of regressions beyond threshold."""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    old = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nvs {Path(baseline_path).name} (commit {baseline['meta']['commit']}):")
+
+    regressions = []
+    for row in rows:
+        prev = old.get((row["scenario"], row["concurrency"]))
+        if prev is None:
+            continue
+        changes = []
+        for metric, higher_is_better in METRICS.items():
+            if not prev.get(metric):
+                continue
+            change = (row[metric] - prev[metric]) / prev[metric]
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > threshold else ""
+            if flag:
+                regressions.append((row["scenario"], row["concurrency"], metric, change))
+            changes.append(f"{metric} {change:+.1%}{flag}")
+        print(f"  {row['scenario']:<6} c={row['concurrency']:<5} " + ", ".join(changes))
+    return regressions
+
+
+def _print(rows):
+    print(f"{'scenario':<9}{'conc':>6}{'conv/s':>10}{'step p50':>10}{'step p99':>10}{'lag p99':>9}{'lag max':>9}{'KB/sess':>9}")
+    for r in rows:
+        print(f"{r['scenario']:<9}{r['concurrency']:>6}{r['conversations_per_s']:>10.1f}{r['step_p50_ms']:>8.2f}ms"
+              f"{r['step_p99_ms']:>8.2f}ms{r['loop_lag_p99_ms']:>7.2f}ms{r['loop_lag_max_ms']:>7.2f}ms{r['memory_per_session_kb']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="local,mcp")
+    parser.add_argument("--concurrency", default="1,10,100", type=lambda s: [int(c) for c in s.split(",")])
+    parser.add_argument("--conversations", type=int, default=200, help="conversations per concurrency level")
+    parser.add_argument("--steps", type=int, default=3, help="tool steps per conversation")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="seconds per model call")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random latency per model call (seconds)")
+    parser.add_argument("--output-bytes", type=int, default=2000, help="size of each model response")
+    parser.add_argument("--tool-latency", type=float, default=0.005, help="latency of the simulated I/O tool (local)")
+    parser.add_argument("--files", type=int, default=500, help="files in the synthetic tree (mcp)")
+    parser.add_argument("--dirs", type=int, default=20)
+    parser.add_argument("--memory-sessions", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", help="baseline results file (default: the previous run)")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for scenario in args.scenarios.split(","):
+        try:
+            rows += asyncio.run(run_scenario(scenario, args))
+        except ImportError as e:
+            print(f"skipping {scenario}: {e}")
+    _print(rows)
+
+    path = None if args.no_save else save(rows, args)
+    if path:
+        print(f"\nsaved {path.relative_to(ROOT)}")
+    baseline = args.compare or _previous(path)
+    if baseline:
+        regressions = compare(rows, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
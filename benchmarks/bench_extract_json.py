@@ -0,0 +1,101 @@
+"""
+Micro-benchmark for pocket_agent.utils.extract_json_objects on large, adversarial model outputs.
+
+Compares the single-pass scanner against the previous raw_decode-and-retry implementation
+(kept below as `legacy_extract_json_objects`).
+
+Usage:
+    python -m benchmarks.bench_extract_json [--sizes 100000,1000000,10000000] [--legacy-max 1000000]
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pocket_agent.utils import extract_json_objects
+
+
+def legacy_extract_json_objects(text: str):
+    text = re.sub(r'```(?:json)?\s*', '', text, flags=re.IGNORECASE)
+    text = text.replace('```', '').strip()
+    decoder = json.JSONDecoder()
+    pos = 0
+    end = len(text)
+    objs = []
+
+    while True:
+        p1 = text.find('{', pos)
+        p2 = text.find('[', pos)
+        pos = p2 if p1 == -1 else p1 if p2 == -1 else min(p1, p2)
+        if pos == -1:
+            break
+        try:
+            obj, pos = decoder.raw_decode(text, pos)
+            objs.append(obj)
+        except ValueError:
+            pos += 1
+            if pos >= end:
+                break
+    return objs
+
+
+STEP = '{"type": "action", "function": "read_file", "input": {"path": "src/main.py"}}'
+CODE = '```js\nif (a[i] { return {x: y[0] }; }\n```\n'
+
+
+def _fill(unit: str, size: int, tail: str = "") -> str:
+    return (unit * (size // len(unit) + 1))[:size] + tail
+
+
+INPUTS = {
+    # prose and code snippets full of stray brackets, with real steps sprinkled in
+    "stray_brackets": lambda n: _fill("see { and [ here, " + CODE + STEP + "\n", n),
+    # a truncated object whose string value is full of brackets (never closes)
+    "truncated_string": lambda n: '{"type": "output", "output": "' + _fill("{[ ", n),
+    # deeply nested truncated JSON: every opener is the start of an unfinished object
+    "nested_truncated": lambda n: _fill('{"a": ', n),
+    # well-formed steps, the common case
+    "valid_steps": lambda n: _fill("```json\n" + STEP + "\n```\n", n),
+}
+
+
+def _time(func, text):
+    start = time.perf_counter()
+    try:
+        func(text)
+    except RecursionError:
+        return None
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000,10000000")
+    parser.add_argument("--legacy-max", type=int, default=100_000,
+                        help="skip the quadratic legacy implementation above this input size")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    print(f"{'input':<18}{'size':>10}{'scanner (s)':>14}{'legacy (s)':>14}{'speedup':>10}")
+    for name, make in INPUTS.items():
+        for size in sizes:
+            text = make(size)
+            new_t = _time(extract_json_objects, text)
+            if size > args.legacy_max:
+                legacy = f"{'skipped':>14}{'':>10}"
+            else:
+                old_t = _time(legacy_extract_json_objects, text)
+                if old_t is None:
+                    legacy = f"{'RecursionError':>14}{'':>10}"
+                else:
+                    legacy = f"{old_t:>14.4f}{old_t / new_t:>9.1f}x"
+            print(f"{name:<18}{size:>10}{new_t:>14.4f}{legacy}")
+
+
+if __name__ == "__main__":
+    main()
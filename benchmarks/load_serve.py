@@ -0,0 +1,157 @@
+"""
+Load test for the HTTP server in pocket_agent/serve.py.
+
+Virtual users send requests back to back (keep-alive for /invoke, one connection per /stream) and the run
+reports requests/s, p50/p99 latency and, for /stream, p50/p99 time to the first SSE step.
+
+With --spawn, a server backed by the scripted agent below (no API key needed) is started first:
+
+    python -m benchmarks.load_serve --spawn --workers 2 --concurrency 50 --requests 2000 [--mode stream]
+
+Against a server you started yourself:
+
+    python -m pocket_agent.serve benchmarks.load_serve:scripted_agent --workers 4
+    python -m benchmarks.load_serve --port 8000 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pocket_agent.agent import Agent
+from pocket_agent.tracing import Tracer
+from benchmarks.bench_agent import ScriptedLLM, _local_actions
+
+
+def scripted_agent():
+    """Server factory: scripted LLM and local tools, latency from BENCH_LLM_LATENCY / BENCH_TOOL_LATENCY."""
+    tools, actions = _local_actions(float(os.environ.get("BENCH_TOOL_LATENCY", "0.005")))
+    llm = ScriptedLLM(actions, steps=int(os.environ.get("BENCH_STEPS", "3")),
+                      latency=float(os.environ.get("BENCH_LLM_LATENCY", "0.02")), output_bytes=500)
+    agent = Agent(llm, tracer=Tracer(exporters=[]), parallel_tools=True)
+    for tool in tools:
+        agent.register_tool(tool, mode="inline")
+    return agent
+
+
+def _request(path, payload):
+    body = json.dumps(payload).encode()
+    return (f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+async def _read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def _invoke_user(host, port, count, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(count):
+            start = time.perf_counter()
+            writer.write(_request("/invoke", {"prompt": f"load {i}"}))
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def _stream_user(host, port, count, latencies, first_steps, errors):
+    for i in range(count):
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(_request("/stream", {"prompt": f"load {i}"}))
+        first, done = None, False
+        while line := await reader.readline():
+            if line.startswith(b"event: step") and first is None:
+                first = time.perf_counter() - start
+            elif line.startswith(b"event: done"):
+                done = True
+        writer.close()
+        latencies.append(time.perf_counter() - start)
+        if first is not None:
+            first_steps.append(first)
+        if not done:
+            errors.append("incomplete stream")
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def run(args):
+    latencies, first_steps, errors = [], [], []
+    per_user = max(1, args.requests // args.concurrency)
+    if args.mode == "stream":
+        users = [_stream_user(args.host, args.port, per_user, latencies, first_steps, errors) for _ in range(args.concurrency)]
+    else:
+        users = [_invoke_user(args.host, args.port, per_user, latencies, errors) for _ in range(args.concurrency)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(latencies)} requests in {elapsed:.2f}s: {len(latencies) / elapsed:.1f} req/s, {len(errors)} errors")
+    print(f"latency p50 {statistics.median(latencies) * 1000:.1f}ms  p99 {_percentile(latencies, 0.99) * 1000:.1f}ms")
+    if first_steps:
+        print(f"first step p50 {statistics.median(first_steps) * 1000:.1f}ms  p99 {_percentile(first_steps, 0.99) * 1000:.1f}ms")
+
+
+async def _wait_ready(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mode", choices=("invoke", "stream"), default="invoke")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--spawn", action="store_true", help="start a server with the scripted agent")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes of the spawned server")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn:
+        root = Path(__file__).resolve().parent.parent
+        server = subprocess.Popen([sys.executable, "-m", "pocket_agent.serve", "benchmarks.load_serve:scripted_agent",
+                                   "--host", args.host, "--port", str(args.port), "--workers", str(args.workers)], cwd=root)
+    try:
+        asyncio.run(_wait_ready(args.host, args.port))
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,523 @@
 import json
+import time
+import asyncio
 
-from .utils import extract_json_objects
-from .system import SYSTEM_PROMPT_TEMPLATE
+from contextlib import aclosing, nullcontext
+
+from .utils import extract_json_objects, JSONStepParser
+from .system import SYSTEM_PROMPT_TEMPLATE, NATIVE_SYSTEM_PROMPT_TEMPLATE
 from .tool import Tool
 from .llm import LLM
+from .history import History, estimate_tokens
+from .loop import run_sync
+from .tracing import Tracer, use_span
+from .ratelimit import RateLimiter, current_limiter
+
+
+
+STOP_REASONS = ("output", "max_steps", "max_tokens", "deadline", "cancelled", "error")
 
 
+class RunResult:
+    """What Agent.arun did: the output (None unless stop_reason is "output"), why it stopped, the steps it added."""
+    def __init__(self):
+        self.output = None
+        self.stop_reason = None
+        self.error = None
+        self.steps = []
+        self.iterations = 0
+        self.tokens = 0
+
+    def __repr__(self):
+        return f"RunResult(stop_reason={self.stop_reason!r}, iterations={self.iterations}, tokens={self.tokens}, output={self.output!r})"
+
 
 class Agent:
-    def __init__(self, llm: LLM, context="You are a helpful assistant."):
+    def __init__(self, llm: LLM, context="You are a helpful assistant.", parallel_tools=False, max_concurrency=None, compact_schema=False,
+                 token_budget=None, max_observation_tokens=None, summarizer=None, tracer=None, native_tools=False,
+                 observation_store=None, max_steps=50, timeout=None, max_tokens=None):
         self.tools = {}
-        self.mcp = {}
+        self.mcp = []
+        self._mcp_tools = {}
         self.llm = llm
         self.context = context
+        self.parallel_tools = parallel_tools
+        self.max_concurrency = max_concurrency
+        self.compact_schema = compact_schema
+        self._tools_version = 0
+        self._prompt_cache = None
+        self.token_budget = token_budget
+        self.max_observation_tokens = max_observation_tokens
+        self.summarizer = summarizer
+        # spans, metrics and log lines (Tracer(exporters=[]) for a silent agent)
+        self.tracer = tracer or Tracer()
+        # use the provider's tool-calling API when the LLM supports it (ainvoke); otherwise the JSON text protocol
+        self.native_tools = native_tools
+        self._specs_cache = None
+        # large tool results go to the store and the history only gets a handle and a preview
+        self.observations = observation_store
+        self._observation_tools = set()
+        if observation_store is not None:
+            for name, func in observation_store.tools():
+                self.tools[name] = Tool(func, name=name, description=func.__doc__, schema=None)
+                self._observation_tools.add(name)
+        # default per-run budgets (see arun): model calls, wall-clock seconds, input + output tokens
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_tokens = max_tokens
 
-    def register_tool(self, func, description=None, schema=None):
-        def wrapper(*args,**kargs):
-            print(f"Running tool {func.__name__}")
-            return func(*args,**kargs)
+    def register_tool(self, func=None, description=None, schema=None, cache=None, mode="thread", timeout=None, executor=None):
+        """
+        Register a function as a tool. Usable as a plain call or decorator, with or without arguments.
+        cache: optional ToolCache (MemoryCache, DiskCache) memoizing results by tool name and input.
+        mode / timeout / executor: how the tool runs, see Tool. mode="process" needs a module-level function.
+        """
+        if func is None:
+            return lambda func: self.register_tool(func, description, schema, cache, mode, timeout, executor)
 
         self.tools[func.__name__] = Tool(
-            wrapper,
+            func,
             name=func.__name__,
             description=description or func.__doc__ or "No description available",
-            schema=schema
+            schema=schema,
+            cache=cache,
+            mode=mode,
+            timeout=timeout,
+            executor=executor
         )
-        return wrapper
+        self._tools_version += 1
+        return func
     
-    def register_mcp(self,mcp_client):
-        self.mcp = mcp_client
+    def register_mcp(self,mcp_client, cache=None):
+        """
+        Expose the tools of an MCPClient or MCPPool. Several servers can be registered side by side.
+        cache: a ToolCache for every tool of the server, or a dict of tool name -> ToolCache.
+        """
+        self.mcp.append(mcp_client)
+        self._load_mcp_tools(mcp_client, cache)
 
-        for tool in mcp_client.tools:
-            name = tool.name
+        if hasattr(mcp_client, "on_tools_changed"):
+            mcp_client.on_tools_changed(lambda client: self._load_mcp_tools(client, cache))
 
+    def _load_mcp_tools(self, mcp_client, cache=None):
+        for name in self._mcp_tools.pop(id(mcp_client), []):
+            self.tools.pop(name, None)
+
+        def mcp_tool(name):
             async def mcp_tool_wrapper(**kwargs):
-                print(f"Calling MCP tool {name} with {kwargs}")
-                response = await mcp_client.session.call_tool(name, kwargs)
-                return response.content[0].text if response.content else None
+                return await mcp_client.call_tool(name, kwargs)
+            return mcp_tool_wrapper
+
+        for tool in mcp_client.tools:
+            name = tool.name
 
             self.tools[name] = Tool(
-                mcp_tool_wrapper,
+                mcp_tool(name),
                 name=name,
                 description=tool.description,
-                schema=tool.inputSchema
+                schema=tool.inputSchema,
+                cache=cache.get(name) if isinstance(cache, dict) else cache
             )
+        self._mcp_tools[id(mcp_client)] = [tool.name for tool in mcp_client.tools]
+        self._tools_version += 1
+
+    def _is_runnable(self, step):
+        return step.get("type") == "action"
+
+    async def _run_action(self, step, debug=False):
+        name = step.get("function")
+        if name not in self.tools:
+            # tell the model instead of ending the run, so it can pick a real tool
+            self.tracer.log(f"Unknown tool: {name}", level="WARNING")
+            return {"type": "observation", "observation": {"error": f"Unknown tool {name!r}. Available tools: {', '.join(self.tools)}"}}
+
+        with self.tracer.span("tool", labels={"tool": name}) as span:
+            self.tracer.log(f"Running tool {name}", input=step.get("input"))
+            try:
+                result = await self.tools[name].acall(step.get("input"))
+            except Exception as e:
+                # a failing (or timed out) tool is reported to the model like an unknown one, so it can recover
+                span.error(e)
+                self.tracer.log(f"Tool {name} failed: {e}", level="WARNING")
+                reason = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                return {"type": "observation", "observation": {"error": f"Tool {name!r} failed: {reason}"}}
+            # the store's own tools are already sized to be read; wrapping them would just hand back another handle
+            wrap = self.observations is not None and name not in self._observation_tools
+            observation = {
+                "type": "observation",
+                "observation": self.observations.wrap(result) if wrap else result
+            }
+            if debug : self.tracer.log(repr(observation), level="DEBUG")
+        return observation
+
+    async def _run_actions(self, actions, debug=False):
+        """Run the actions of one turn, concurrently when parallel_tools is set. Results keep action order."""
+        if not self.parallel_tools or len(actions) < 2:
+            return [await self._run_action(step, debug) for step in actions]
+
+        limit = asyncio.Semaphore(self.max_concurrency or len(actions))
+
+        async def run(step):
+            async with limit:
+                return await self._run_action(step, debug)
+
+        tasks = [asyncio.ensure_future(run(step)) for step in actions]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            # gather only cancels its children when it is cancelled itself, not when one of them fails
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    def _system_prompt(self, native=False):
+        # Rebuilt only when a tool is registered (or context/compact_schema change), not on every request.
+        key = (self._tools_version, self.context, self.compact_schema, native)
+        if self._prompt_cache is None or self._prompt_cache[0] != key:
+            if native:
+                prompt = NATIVE_SYSTEM_PROMPT_TEMPLATE.format(context=self.context)
+            else:
+                tools = "\n".join( tool.render(self.compact_schema) for tool in self.tools.values())
+                prompt = SYSTEM_PROMPT_TEMPLATE.format(context=self.context,tools=tools)
+            self._prompt_cache = (key, prompt)
+        return self._prompt_cache[1]
+
+    def _tool_specs(self):
+        if self._specs_cache is None or self._specs_cache[0] != self._tools_version:
+            self._specs_cache = (self._tools_version, [tool.spec() for tool in self.tools.values()])
+        return self._specs_cache[1]
+
+    def _native(self):
+        return self.native_tools and self.llm.supports_tools
 
+    @staticmethod
+    def _native_steps(text, calls):
+        """A native tool-calling turn as JSON steps, so history looks the same in both modes."""
+        if not calls:
+            return [{"type": "output", "output": text or ""}]
+        steps = [{"type": "plan", "plan": text}] if text else []
+        return steps + [{"type": "action", "function": call["function"], "input": call["input"]} for call in calls]
 
-    async def ainvoke(self, prompt, debug=False):
-        tools = "\n".join( str(tool) for tool in self.tools.values())
-        SYSTEM_PROMPT = SYSTEM_PROMPT_TEMPLATE.format(context=self.context,tools=tools)
+    def _llm_labels(self):
+        return {"provider": type(self.llm).__name__, "model": getattr(self.llm, "model", None)}
 
-        history = [
-            {"role": "user", "content": json.dumps({"type": "user", "user": prompt})}
-        ]
+    def _start_history(self, prompt, session=None):
+        history = session.history if session is not None else History()
+        history.token_budget = self.token_budget
+        history.max_observation_tokens = self.max_observation_tokens
+        history.summarizer = self.summarizer
+        history.append({"type": "user", "user": prompt})
+        return history
 
-        while True:
+    async def _agenerate(self, system_prompt, history, tools=None):
+        if tools is None:
+            generate, kwargs = self.llm.agenerate_response, {}
+        else:
+            generate, kwargs = self.llm.agenerate_tool_calls, {"tools": tools}
+
+        limiter = current_limiter.get()
+        if limiter is None:
+            return await generate(system_instruction=system_prompt, content=history.messages, **kwargs)
+        return await limiter.call(generate, system_instruction=system_prompt, content=history.messages,
+                                  tokens=estimate_tokens(system_prompt) + history.tokens, **kwargs)
+
+    def invoke(self, prompt, debug=False, session=None, timeout=None, max_steps=None, max_tokens=None):
+        """
+        Synchronous ainvoke for WSGI / threaded servers. Runs on one background event loop shared by all callers,
+        so concurrent threads run concurrently without creating a loop per prompt.
+        MCP clients used by this agent must have been connected on that same loop (see pocket_agent.loop).
+        Budgets are those of arun: a run past its timeout returns None (the partial turn is dropped), it does not raise.
+        """
+        return run_sync(self.ainvoke(prompt, debug, session, timeout=timeout, max_steps=max_steps, max_tokens=max_tokens))
+
+    async def ainvoke(self, prompt, debug=False, session=None, **budgets):
+        """Run the prompt and return its output (None if the run stopped early, see arun for budgets)."""
+        return (await self.arun(prompt, debug, session, **budgets)).output
+
+    async def arun(self, prompt, debug=False, session=None, timeout=None, max_steps=None, max_tokens=None, cancel=None):
+        """
+        Run the prompt until an output or until a budget runs out, and return a RunResult (partial on early stop).
+
+        timeout: seconds for the whole run. max_steps: model calls. max_tokens: input + output tokens over all
+        model calls (provider-reported when available, estimated otherwise). Each defaults to the agent's own.
+        cancel: an asyncio.Event; setting it stops the run with stop_reason "cancelled".
+        A deadline or cancel interrupts whatever is awaited at that moment (model request, tool calls, MCP calls)
+        and drops the unfinished turn, so the history stays consistent. Cancelling the calling task does the same
+        but raises CancelledError instead of returning.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        max_steps = self.max_steps if max_steps is None else max_steps
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        result = RunResult()
+
+        async with (session.lock if session is not None else nullcontext()):
+            history = self._start_history(prompt, session)
+
+            body = asyncio.ensure_future(self._run(history, result, debug, max_steps, max_tokens))
+            waiters = {body}
+            stopper = None
+            if cancel is not None:
+                stopper = asyncio.ensure_future(cancel.wait())
+                waiters.add(stopper)
             try:
-                response = self.llm.generate_response(system_instruction=SYSTEM_PROMPT, content=history)
-                if debug : print(f"[DEBUG:57] {repr(response)}")
-
-                steps = extract_json_objects(response)
-                for step in steps:
-                    history.append({"role": "user", "content": json.dumps(step)})
-                    
-                    if step.get("type") == "output":
-                        return step.get("output")
-                    
-                    if step.get("type") == "action":
-                        tool_name = step.get("function")
-                        tool_input = step.get("input")
-
-                        if tool_name not in self.tools:
-                            print(f"Unknown tool: {tool_name}")
+                done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in waiters:
+                    task.cancel()
+                await asyncio.gather(*waiters, return_exceptions=True)
+
+            if body not in done:
+                result.stop_reason = "cancelled" if stopper in done else "deadline"
+                self.tracer.log(f"Run stopped: {result.stop_reason}", level="WARNING", iterations=result.iterations)
+        return result
+
+    def _count_tokens(self, span, system_prompt, history, response):
+        used_in = span.attributes.get("input_tokens")
+        used_out = span.attributes.get("output_tokens")
+        if used_in is None:
+            used_in = estimate_tokens(system_prompt) + history.tokens
+        if used_out is None:
+            used_out = estimate_tokens(response if isinstance(response, str) else json.dumps(response, default=str))
+        return used_in + used_out
+
+    async def _run(self, history, result, debug, max_steps, max_tokens):
+        native = self._native()
+        SYSTEM_PROMPT = self._system_prompt(native)
+
+        with self.tracer.span("agent.invoke") as invoke_span:
+            try:
+                while True:
+                    if max_steps is not None and result.iterations >= max_steps:
+                        result.stop_reason = "max_steps"
+                        return
+                    if max_tokens is not None and result.tokens >= max_tokens:
+                        result.stop_reason = "max_tokens"
+                        return
+
+                    result.iterations += 1
+                    invoke_span.set(iterations=result.iterations)
+                    self.tracer.metrics.inc("loop_iterations_total")
+
+                    await history.acompact()
+                    with self.tracer.span("llm.request", labels=self._llm_labels(), history_tokens=history.tokens, native=native) as llm_span:
+                        if native:
+                            response = await self._agenerate(SYSTEM_PROMPT, history, self._tool_specs())
+                        else:
+                            response = await self._agenerate(SYSTEM_PROMPT, history)
+                    result.tokens += self._count_tokens(llm_span, SYSTEM_PROMPT, history, response)
+                    if debug : self.tracer.log(repr(response), level="DEBUG")
+
+                    if native:
+                        steps = self._native_steps(*response)
+                    else:
+                        with self.tracer.span("parse") as parse_span:
+                            steps = extract_json_objects(response, steps_only=True)
+                            parse_span.set(steps=len(steps))
+
+                    turn, output = [], None
+                    for step in steps:
+                        turn.append(step)
+                        if step.get("type") == "output":
+                            output = step
                             break
 
-                        observation = {
-                            "type": "observation",
-                            "observation": await self.tools[tool_name].acall(tool_input)
-                        }
-                        if debug : print(f"[DEBUG:78] {observation}")
-                        history.append({"role":"user", "content": json.dumps(observation)})
+                    actions = [step for step in turn if self._is_runnable(step)]
+                    observations = iter(await self._run_actions(actions, debug))
+
+                    if not turn:
+                        # nothing usable in the response: say so rather than resend the same request
+                        turn = [{"type": "observation", "observation": {"error": "No valid JSON step in the response. Reply with JSON steps only."}}]
+                    for step in turn:
+                        history.append(step)
+                        result.steps.append(step)
+                        if self._is_runnable(step):
+                            observation = next(observations)
+                            history.append(observation)
+                            result.steps.append(observation)
+
+                    if output is not None:
+                        result.output = output.get("output")
+                        result.stop_reason = "output"
+                        return
+            except Exception as e:
+                invoke_span.error(e)
+                self.tracer.log(f"Something went wrong: {e}", level="ERROR")
+                result.stop_reason = "error"
+                result.error = e
+            finally:
+                invoke_span.set(tokens=result.tokens, stop_reason=result.stop_reason)
+
+    async def abatch(self, prompts, max_concurrency=8, rate_limit=None, debug=False):
+        """
+        Run arun over many prompts concurrently and yield (index, RunResult) pairs in completion order; check
+        result.stop_reason / result.error for runs that ended without an output. An exception raised by the
+        prompts iterable stops the batch and is re-raised here.
+        prompts can be any iterable (it is consumed lazily, so a generator over millions of records is fine).
+        rate_limit: a RateLimiter, or a dict like {"rpm": 500, "tpm": 200_000} for the limiter shared by every
+        batch on this agent's provider and model. Rate-limited (429) model calls are retried with backoff.
+        """
+        if isinstance(rate_limit, dict):
+            rate_limit = RateLimiter.shared(self.llm, **rate_limit)
+
+        pending = iter(enumerate(prompts))
+        results = asyncio.Queue()
+        done = object()
+
+        async def worker():
+            current_limiter.set(rate_limit)
+            try:
+                for index, prompt in pending:
+                    await results.put((index, await self.arun(prompt, debug)))
             except Exception as e:
-                print(f"Something went wrong: {e}")
-                break
+                results.put_nowait(e)
+            finally:
+                results.put_nowait(done)
+
+        workers = [asyncio.create_task(worker()) for _ in range(max_concurrency)]
+        try:
+            running = len(workers)
+            while running:
+                item = await results.get()
+                if item is done:
+                    running -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
 
+    async def astream(self, prompt, debug=False, session=None, timeout=None, max_steps=None, max_tokens=None):
+        """
+        Like ainvoke, but streams the model output and yields every step (plan, action, observation, output) live.
+        Tool calls start as soon as their action is parsed, while the model is still generating.
+        Always uses the JSON text protocol, also with native_tools.
+        Budgets work as in arun; a run that ends without an output yields {"type": "stop", "reason": ...} last.
+        The deadline only covers the agent's own awaits, not the time the consumer takes between steps.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        max_steps = self.max_steps if max_steps is None else max_steps
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        async def within(aw):
+            # wait_for rather than asyncio.timeout: a timeout scope must not span the yields of this generator
+            if deadline is None:
+                return await aw
+            return await asyncio.wait_for(aw, max(0.0, deadline - time.monotonic()))
+
+        async with (session.lock if session is not None else nullcontext()):
+            SYSTEM_PROMPT = self._system_prompt()
+
+            history = self._start_history(prompt, session)
+            limit = asyncio.Semaphore((self.max_concurrency or 64) if self.parallel_tools else 1)
+
+            async def run(step):
+                async with limit:
+                    return await self._run_action(step, debug)
+
+            # spans are made current only around awaits: a context variable set here would leak to the consumer at each yield
+            invoke_span = self.tracer.start_span("agent.stream")
+            iterations, tokens, reason = 0, 0, None
+            try:
+                while True:
+                    if max_steps is not None and iterations >= max_steps:
+                        reason = "max_steps"
+                        break
+                    if max_tokens is not None and tokens >= max_tokens:
+                        reason = "max_tokens"
+                        break
+
+                    iterations += 1
+                    invoke_span.set(iterations=iterations)
+                    self.tracer.metrics.inc("loop_iterations_total")
+                    turn, tasks, output, stop = [], {}, None, False
+                    try:
+                        with use_span(invoke_span):
+                            await within(history.acompact())
+                        parser = JSONStepParser()
+                        labels = self._llm_labels()
+                        llm_span = self.tracer.start_span("llm.request", parent=invoke_span, labels=labels, history_tokens=history.tokens, stream=True)
+                        parse_time, received = 0.0, []
+                        try:
+                            async with aclosing(self.llm.stream_response(system_instruction=SYSTEM_PROMPT, content=history.messages)) as stream:
+                                while True:
+                                    with use_span(llm_span):
+                                        chunk = await within(anext(stream, None))
+                                    start = time.perf_counter()
+                                    if chunk is None:
+                                        # steps hidden behind an unmatched brace only show up at the end
+                                        steps = parser.finish()
+                                        stop = True
+                                    else:
+                                        received.append(chunk)
+                                        if "ttft" not in llm_span.attributes:
+                                            ttft = start - llm_span._start
+                                            llm_span.set(ttft=ttft)
+                                            self.tracer.metrics.observe("llm_ttft_seconds", ttft, **labels)
+                                        if debug : self.tracer.log(repr(chunk), level="DEBUG")
+                                        start = time.perf_counter()
+                                        steps = parser.feed(chunk)
+                                    parse_time += time.perf_counter() - start
+
+                                    for step in steps:
+                                        turn.append(step)
+                                        yield step
+
+                                        if step.get("type") == "output":
+                                            output, stop = step, True
+                                            break
+
+                                        if self._is_runnable(step):
+                                            with use_span(invoke_span):
+                                                tasks[id(step)] = asyncio.create_task(run(step))
+
+                                    if stop:
+                                        break
+                        finally:
+                            llm_span.set(parse_seconds=parse_time)
+                            self.tracer.metrics.observe("parse_seconds", parse_time)
+                            llm_span.end()
+                        tokens += self._count_tokens(llm_span, SYSTEM_PROMPT, history, "".join(received))
+
+                        observations = []
+                        for step in turn:
+                            if self._is_runnable(step):
+                                observations.append(await within(tasks[id(step)]))
+                        if not turn:
+                            turn = [{"type": "observation", "observation": {"error": "No valid JSON step in the response. Reply with JSON steps only."}}]
+
+                        # the turn goes into the history only once all of its tool calls are back
+                        observations = iter(observations)
+                        for step in turn:
+                            history.append(step)
+                            if self._is_runnable(step):
+                                observation = next(observations)
+                                history.append(observation)
+                                yield observation
+
+                        if output is not None:
+                            reason = "output"
+                            return
+                    except Exception as e:
+                        # only our own wait_for counts as the deadline, not a TimeoutError raised by the model client
+                        if isinstance(e, asyncio.TimeoutError) and deadline is not None and time.monotonic() >= deadline:
+                            reason = "deadline"
+                            break
+                        invoke_span.error(e)
+                        self.tracer.log(f"Something went wrong: {e}", level="ERROR")
+                        reason = "error"
+                        break
+                    finally:
+                        for task in tasks.values():
+                            task.cancel()
+            finally:
+                invoke_span.set(tokens=tokens, stop_reason=reason)
+                invoke_span.end()
 
+            if reason != "output":
+                self.tracer.log(f"Run stopped: {reason}", level="WARNING", iterations=iterations)
+                yield {"type": "stop", "reason": reason}
@@ -0,0 +1,152 @@
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .tracing import current_span
+
+
+def cache_key(tool_name, tool_input):
+    """Tool name plus canonical JSON of its input, so argument order and spacing don't matter."""
+    return tool_name + ":" + json.dumps(tool_input or {}, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolCache:
+    """
+    Base class for tool-result caches. Subclasses implement _get/_set.
+    Identical calls already in flight are joined instead of run again.
+    """
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.joins = 0
+        self._inflight = {}
+
+    def _get(self, key):
+        """Return (found, value)."""
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+    def _expiry(self):
+        return time.time() + self.ttl if self.ttl else None
+
+    @staticmethod
+    def _trace(result):
+        span = current_span()
+        if span is not None:
+            span.set(cache=result)
+
+    async def aget_or_call(self, key, call):
+        found, value = self._get(key)
+        if found:
+            self.hits += 1
+            self._trace("hit")
+            return value
+
+        if key in self._inflight:
+            self.joins += 1
+            self._trace("join")
+            return await asyncio.shield(self._inflight[key])
+
+        self.misses += 1
+        self._trace("miss")
+        task = asyncio.ensure_future(call())
+        self._inflight[key] = task
+
+        def done(t):
+            self._inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None:
+                self._set(key, t.result())
+
+        task.add_done_callback(done)
+        # a cancelled caller must not cancel the call for the others joined on it
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "joins": self.joins, "inflight": len(self._inflight)}
+
+
+class MemoryCache(ToolCache):
+    """In-process LRU with optional TTL (seconds)."""
+    def __init__(self, maxsize=1024, ttl=None):
+        super().__init__(ttl)
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires is not None and expires < time.time():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _set(self, key, value):
+        self._data[key] = (self._expiry(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {**super().stats(), "size": len(self._data)}
+
+
+class DiskCache(ToolCache):
+    """
+    On-disk store (SQLite) that can be shared by several worker processes.
+    Only JSON-serialisable results are stored.
+    """
+    def __init__(self, path, ttl=None):
+        super().__init__(ttl)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS tool_cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key):
+        row = self._conn().execute("SELECT value, expires FROM tool_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            with self._conn() as conn:
+                conn.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+            return False, None
+        return True, json.loads(value)
+
+    def _set(self, key, value):
+        try:
+            value = json.dumps(value)
+        except (TypeError, ValueError):
+            return
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?)", (key, value, self._expiry()))
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM tool_cache")
+
+    def stats(self):
+        size = self._conn().execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0]
+        return {**super().stats(), "size": size}
@@ -0,0 +1,129 @@
+import atexit
+import pickle
+import asyncio
+import multiprocessing
+from collections import deque
+
+
+def _worker_main(conn, memory_limit):
+    if memory_limit:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+    while True:
+        try:
+            func, kwargs = pickle.loads(conn.recv_bytes())
+        except EOFError:
+            return
+        try:
+            reply = (True, func(**kwargs))
+        except BaseException as e:
+            reply = (False, e)
+        try:
+            payload = pickle.dumps(reply, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            payload = pickle.dumps((False, RuntimeError(f"Tool result could not be pickled: {e}")))
+        conn.send_bytes(payload)
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, memory_limit), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+
+
+class ProcessExecutor:
+    """
+    Warm pool of worker processes for CPU-bound or untrusted tools.
+
+    Each call runs in a separate process, so it neither holds the GIL against the event loop nor can it hang the
+    agent: on timeout or cancellation the worker is killed and replaced. memory_limit (bytes) caps each
+    worker's address space where the platform supports it. Functions, arguments and results travel pickled
+    (highest protocol); the function must be importable by reference (module level, and a script's own tools
+    need the `if __name__ == "__main__":` guard), since workers start fresh rather than as a copy of the agent.
+    context: multiprocessing start method. Defaults to "forkserver" (or "spawn" where that is missing): the
+    agent process runs threads (the background loop, to_thread workers, the metrics server) and forking a
+    multi-threaded process can deadlock the child.
+    """
+    def __init__(self, workers=2, memory_limit=None, context=None):
+        self.workers = workers
+        self.memory_limit = memory_limit
+        if context is None:
+            context = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._ctx = multiprocessing.get_context(context)
+        self._idle = deque(_Worker(self._ctx, memory_limit) for _ in range(workers))
+        self._available = None
+        self._closed = False
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.memory_limit)
+
+    async def run(self, func, kwargs, timeout=None):
+        if self._closed:
+            raise RuntimeError("ProcessExecutor is closed")
+        if self._available is None:
+            self._available = asyncio.Semaphore(self.workers)
+
+        async with self._available:
+            worker = self._idle.popleft()
+            healthy = False
+            try:
+                ok, value = await asyncio.wait_for(self._call(worker, func, kwargs), timeout)
+                healthy = True
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Tool {getattr(func, '__name__', func)} timed out after {timeout}s")
+            finally:
+                if not healthy:
+                    # timed out, cancelled or crashed: the worker may still be busy, replace it
+                    worker.kill()
+                    worker = self._spawn()
+                self._idle.append(worker)
+
+        if not ok:
+            raise value
+        return value
+
+    async def _call(self, worker, func, kwargs):
+        loop = asyncio.get_running_loop()
+        worker.conn.send_bytes(pickle.dumps((func, kwargs), protocol=pickle.HIGHEST_PROTOCOL))
+
+        readable = loop.create_future()
+        loop.add_reader(worker.conn.fileno(), lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(worker.conn.fileno())
+
+        try:
+            return pickle.loads(worker.conn.recv_bytes())
+        except EOFError:
+            worker.process.join(1)
+            raise RuntimeError(f"Tool worker died (exit code {worker.process.exitcode})")
+
+    def close(self):
+        self._closed = True
+        while self._idle:
+            self._idle.popleft().kill()
+
+
+_default = None
+
+
+def default_process_executor():
+    """Executor shared by tools registered with mode="process" and no executor of their own."""
+    global _default
+    if _default is None:
+        _default = ProcessExecutor()
+        atexit.register(_default.close)
+    return _default
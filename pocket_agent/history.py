@@ -0,0 +1,126 @@
+import json
+
+SUMMARY_PROMPT = """
+Summarize the following agent steps (plans, tool actions and their observations) for the agent's own later use.
+Keep every fact, number, file path and tool result needed to finish the task. Reply with plain text only.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    """Keep the head and tail of text, dropping the middle."""
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]}\n...[truncated {len(text) - max_chars} chars]...\n{text[-tail:]}"
+
+
+class History:
+    """
+    Conversation history sent to the LLM on every step, kept under a token budget.
+
+    When the estimated size goes over token_budget, acompact() applies, in order:
+      1. drop the content of old observations,
+      2. roll old steps up into one summary using `summarizer` (any LLM), if given,
+      3. drop the oldest steps.
+    The last `keep_recent` messages and user prompts are never dropped.
+    Independently, observations over max_observation_tokens are cut to head/tail on append.
+    """
+    def __init__(self, token_budget=None, max_observation_tokens=None, keep_recent=6, summarizer=None):
+        self.token_budget = token_budget
+        self.max_observation_tokens = max_observation_tokens
+        self.keep_recent = keep_recent
+        self.summarizer = summarizer
+        self.steps = []
+        self.messages = []
+        self._sizes = []
+
+    @property
+    def tokens(self):
+        return sum(self._sizes)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, step):
+        if step.get("type") == "observation" and self.max_observation_tokens:
+            step = self._truncate_observation(step)
+        self._insert(len(self.steps), step)
+
+    def _truncate_observation(self, step):
+        observation = step.get("observation")
+        text = observation if isinstance(observation, str) else json.dumps(observation, default=str)
+        if estimate_tokens(text) <= self.max_observation_tokens:
+            return step
+        return {**step, "observation": truncate_middle(text, self.max_observation_tokens * 4)}
+
+    def _replace(self, index, step):
+        content = json.dumps(step, default=str)
+        self.steps[index] = step
+        self.messages[index] = {"role": "user", "content": content}
+        self._sizes[index] = estimate_tokens(content)
+
+    def _insert(self, index, step):
+        content = json.dumps(step, default=str)
+        self.steps.insert(index, step)
+        self.messages.insert(index, {"role": "user", "content": content})
+        self._sizes.insert(index, estimate_tokens(content))
+
+    def _delete(self, start, end):
+        del self.steps[start:end]
+        del self.messages[start:end]
+        del self._sizes[start:end]
+
+    def _compactable(self):
+        """Index range [start, end) of messages that may be compacted."""
+        end = max(len(self.messages) - self.keep_recent, 0)
+        # the original prompt stays first; earlier summaries are folded into the next one
+        start = 1 if self.steps and self.steps[0].get("type") == "user" else 0
+        return min(start, end), end
+
+    def _latest_user(self):
+        for i in range(len(self.steps) - 1, -1, -1):
+            if self.steps[i].get("type") == "user":
+                return i
+        return -1
+
+    def _over_budget(self):
+        return self.token_budget is not None and self.tokens > self.token_budget
+
+    async def acompact(self):
+        if not self._over_budget():
+            return
+
+        start, end = self._compactable()
+
+        for i in range(start, end):
+            step = self.steps[i]
+            if step.get("type") == "observation" and not step.get("elided"):
+                self._replace(i, {"type": "observation", "observation": f"[elided {self._sizes[i]} tokens]", "elided": True})
+                if not self._over_budget():
+                    return
+
+        latest_user = self._latest_user()
+        stop = latest_user if start <= latest_user < end else end
+        if self.summarizer is not None and stop - start > 1:
+            old = "\n".join(m["content"] for m in self.messages[start:stop])
+            summary = await self.summarizer.agenerate_response(
+                system_instruction=SUMMARY_PROMPT,
+                content=[{"role": "user", "content": old}]
+            )
+            self._delete(start, stop)
+            self._insert(start, {"type": "summary", "summary": summary})
+            start, end = self._compactable()
+
+        i = start
+        while self._over_budget() and i < end:
+            if self.steps[i].get("type") == "user":
+                i += 1
+                continue
+            self._delete(i, i + 1)
+            end -= 1
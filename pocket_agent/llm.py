@@ -1,5 +1,46 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import deque
+from contextlib import aclosing
+from pathlib import Path
+
+from .tracing import record_usage, current_span
+
+
+def _arguments(raw):
+    """Tool-call arguments as a dict (providers send a dict or a JSON string)."""
+    if isinstance(raw, dict):
+        return raw
+    try:
+        value = json.loads(raw or "{}")
+    except (TypeError, ValueError):
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
 class LLM:
-    def generate_response(): pass
+    # True when agenerate_tool_calls uses the provider's native tool-calling API
+    supports_tools = False
+
+    def generate_response(self, system_instruction, content): pass
+
+    async def agenerate_response(self, system_instruction, content):
+        # Fallback for sync-only backends: keep the event loop free while the SDK blocks.
+        return await asyncio.to_thread(self.generate_response, system_instruction, content)
+
+    async def stream_response(self, system_instruction, content):
+        # Backends without a streaming API yield the whole completion as one chunk.
+        yield await self.agenerate_response(system_instruction, content)
+
+    async def agenerate_tool_calls(self, system_instruction, content, tools):
+        """
+        One turn with native tool calling. tools: [{"name", "description", "parameters"}] (see Tool.spec).
+        Returns (text, calls) with calls as [{"function": name, "input": {...}}]; no calls means text is the answer.
+        """
+        raise NotImplementedError
 
 class OpenaiLLM(LLM):
     def __init__(self, model="gpt-5"):
@@ -7,25 +48,72 @@ class OpenaiLLM(LLM):
         self.model = model
 
         try:
-            from openai import OpenAI
+            from openai import OpenAI, AsyncOpenAI
             self.client = OpenAI()
+            self.async_client = AsyncOpenAI()
         except Exception:
             raise ImportError("Openai SDK not found. Install the official Openai client per Openai docs.")
         
-
-    def generate_response(self, system_instruction, content):
-        response = self.client.responses.create(
-            model="gpt-5",
-            instructions=system_instruction,
-            input=[
+    def _messages(self, system_instruction, content):
+        return [
                     {
                         "role": "developer",
                         "content": system_instruction,
                     }
-                ]+ content,
+                ]+ content
+
+    @staticmethod
+    def _usage(response):
+        if getattr(response, "usage", None) is not None:
+            record_usage(response.usage.input_tokens, response.usage.output_tokens)
+
+    def generate_response(self, system_instruction, content):
+        response = self.client.responses.create(
+            model=self.model,
+            instructions=system_instruction,
+            input=self._messages(system_instruction, content),
+        )
+        self._usage(response)
+
+        return response.output_text
+
+    async def agenerate_response(self, system_instruction, content):
+        response = await self.async_client.responses.create(
+            model=self.model,
+            instructions=system_instruction,
+            input=self._messages(system_instruction, content),
+        )
+        self._usage(response)
+
+        return response.output_text
+
+    async def stream_response(self, system_instruction, content):
+        stream = await self.async_client.responses.create(
+            model=self.model,
+            instructions=system_instruction,
+            input=self._messages(system_instruction, content),
+            stream=True,
         )
 
-        return response.output_text[0].content[0].text
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                yield event.delta
+            elif event.type == "response.completed":
+                self._usage(event.response)
+
+    supports_tools = True
+
+    async def agenerate_tool_calls(self, system_instruction, content, tools):
+        response = await self.async_client.responses.create(
+            model=self.model,
+            instructions=system_instruction,
+            input=self._messages(system_instruction, content),
+            tools=[{"type": "function", "strict": False, **tool} for tool in tools],
+        )
+        self._usage(response)
+
+        calls = [{"function": item.name, "input": _arguments(item.arguments)} for item in response.output if item.type == "function_call"]
+        return response.output_text, calls
 
 
 class GenaiLLM(LLM):
@@ -34,15 +122,14 @@ class GenaiLLM(LLM):
         self.model = model
 
         if not api_key:
-            raise ValueError("Mistral API key not provided.")
+            raise ValueError("Genai API key not provided.")
         try:
             from google import genai
             self.client = genai.Client(api_key=api_key)
         except Exception:
             raise ImportError("Genai SDK not found. Install the official Genai client per Google Genai docs.")
         
-
-    def generate_response(self, system_instruction, content):
+    def _request(self, system_instruction, content):
         from google.genai.types import Content, GenerateContentConfig, Part
 
         contents = [
@@ -53,13 +140,57 @@ class GenaiLLM(LLM):
             for entry in content
         ]
 
-        response = self.client.models.generate_content(
+        return dict(
             model=self.model,
             contents=contents,
             config=GenerateContentConfig(system_instruction=system_instruction)
         )
 
+    @staticmethod
+    def _usage(response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            record_usage(usage.prompt_token_count, usage.candidates_token_count)
+
+    def generate_response(self, system_instruction, content):
+        response = self.client.models.generate_content(**self._request(system_instruction, content))
+        self._usage(response)
+
         return response.candidates[0].content.parts[0].text
+
+    async def agenerate_response(self, system_instruction, content):
+        response = await self.client.aio.models.generate_content(**self._request(system_instruction, content))
+        self._usage(response)
+
+        return response.candidates[0].content.parts[0].text
+
+    async def stream_response(self, system_instruction, content):
+        async for chunk in await self.client.aio.models.generate_content_stream(**self._request(system_instruction, content)):
+            if chunk.text:
+                yield chunk.text
+            # usage metadata is cumulative, the last chunk has the totals
+            self._usage(chunk)
+
+    supports_tools = True
+
+    async def agenerate_tool_calls(self, system_instruction, content, tools):
+        from google.genai.types import FunctionDeclaration, GenerateContentConfig, Tool
+
+        request = self._request(system_instruction, content)
+        request["config"] = GenerateContentConfig(
+            system_instruction=system_instruction,
+            tools=[Tool(function_declarations=[
+                FunctionDeclaration(name=t["name"], description=t["description"], parameters_json_schema=t["parameters"])
+                for t in tools
+            ])],
+        )
+        response = await self.client.aio.models.generate_content(**request)
+        self._usage(response)
+
+        parts = response.candidates[0].content.parts or []
+        calls = [{"function": p.function_call.name, "input": dict(p.function_call.args or {})} for p in parts if p.function_call]
+        text = "".join(p.text for p in parts if p.text) or None
+        return text, calls
     
 class MistralLLM(LLM):
     def __init__(self, api_key: str , model: str = "magistral-medium-latest"):
@@ -73,9 +204,8 @@ class MistralLLM(LLM):
         except Exception:
             raise ImportError("Mistral SDK not found. Install the official Mistral client per Mistral docs ")
 
-    def generate_response(self, system_instruction: str, content) -> str:
-        try:
-            chat_response = self.client.chat.complete(
+    def _request(self, system_instruction: str, content):
+        return dict(
                     model = self.model,
                     messages = [
                         {
@@ -87,11 +217,58 @@ class MistralLLM(LLM):
                         "type": "json_object",
                     }
                 )
-            
+
+    @staticmethod
+    def _usage(response):
+        if getattr(response, "usage", None) is not None:
+            record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+
+    def generate_response(self, system_instruction: str, content) -> str:
+        try:
+            chat_response = self.client.chat.complete(**self._request(system_instruction, content))
+            self._usage(chat_response)
+
+            return chat_response.choices[0].message.content
+        except Exception as e:
+            raise RuntimeError(f"Mistral response generation failed: {e}")
+
+    async def agenerate_response(self, system_instruction: str, content) -> str:
+        try:
+            chat_response = await self.client.chat.complete_async(**self._request(system_instruction, content))
+            self._usage(chat_response)
+
             return chat_response.choices[0].message.content
         except Exception as e:
             raise RuntimeError(f"Mistral response generation failed: {e}")
 
+    async def stream_response(self, system_instruction: str, content):
+        try:
+            stream = await self.client.chat.stream_async(**self._request(system_instruction, content))
+
+            async for chunk in stream:
+                delta = chunk.data.choices[0].delta.content
+                if delta:
+                    yield delta
+                self._usage(chunk.data)
+        except Exception as e:
+            raise RuntimeError(f"Mistral response streaming failed: {e}")
+
+    supports_tools = True
+
+    async def agenerate_tool_calls(self, system_instruction: str, content, tools):
+        request = self._request(system_instruction, content)
+        del request["response_format"]  # a JSON-only answer would rule out plain-text replies
+        request["tools"] = [{"type": "function", "function": tool} for tool in tools]
+        try:
+            chat_response = await self.client.chat.complete_async(**request)
+            self._usage(chat_response)
+
+            message = chat_response.choices[0].message
+            calls = [{"function": c.function.name, "input": _arguments(c.function.arguments)} for c in message.tool_calls or []]
+            return message.content, calls
+        except Exception as e:
+            raise RuntimeError(f"Mistral tool call failed: {e}")
+
 class CoherelLLM(LLM):
     def __init__(self, api_key: str , model: str = "command-a-03-2025"):
         self.model = model
@@ -100,13 +277,13 @@ class CoherelLLM(LLM):
             raise ValueError("Cohere API key not provided.")
         try:
             import cohere
-            self.client = cohere.ClientV2()
+            self.client = cohere.ClientV2(api_key=api_key)
+            self.async_client = cohere.AsyncClientV2(api_key=api_key)
         except Exception:
             raise ImportError("cohere SDK not found. Install the official Cohere client per Cohere docs ")
 
-    def generate_response(self, system_instruction: str, content) -> str:
-        try:
-            chat_response = self.client.chat(
+    def _request(self, system_instruction: str, content):
+        return dict(
                 model=self.model,
                 messages=[
                         {
@@ -118,7 +295,392 @@ class CoherelLLM(LLM):
                         "type": "json_object"
                     }
             )
-            
+
+    @staticmethod
+    def _usage(response):
+        tokens = getattr(getattr(response, "usage", None), "tokens", None)
+        if tokens is not None:
+            record_usage(tokens.input_tokens, tokens.output_tokens)
+
+    def generate_response(self, system_instruction: str, content) -> str:
+        try:
+            chat_response = self.client.chat(**self._request(system_instruction, content))
+            self._usage(chat_response)
+
+            return chat_response.message.content[0].text
+        except Exception as e:
+            raise RuntimeError(f"Cohere response generation failed: {e}")
+
+    async def agenerate_response(self, system_instruction: str, content) -> str:
+        try:
+            chat_response = await self.async_client.chat(**self._request(system_instruction, content))
+            self._usage(chat_response)
+
             return chat_response.message.content[0].text
         except Exception as e:
             raise RuntimeError(f"Cohere response generation failed: {e}")
+
+    async def stream_response(self, system_instruction: str, content):
+        try:
+            async for event in self.async_client.chat_stream(**self._request(system_instruction, content)):
+                if event.type == "content-delta":
+                    yield event.delta.message.content.text
+                elif event.type == "message-end":
+                    self._usage(event.delta)
+        except Exception as e:
+            raise RuntimeError(f"Cohere response streaming failed: {e}")
+
+    supports_tools = True
+
+    async def agenerate_tool_calls(self, system_instruction: str, content, tools):
+        request = self._request(system_instruction, content)
+        del request["response_format"]
+        request["tools"] = [{"type": "function", "function": tool} for tool in tools]
+        try:
+            chat_response = await self.async_client.chat(**request)
+            self._usage(chat_response)
+
+            message = chat_response.message
+            calls = [{"function": c.function.name, "input": _arguments(c.function.arguments)} for c in message.tool_calls or []]
+            text = message.content[0].text if message.content else message.tool_plan
+            return text, calls
+        except Exception as e:
+            raise RuntimeError(f"Cohere tool call failed: {e}")
+
+
+def request_key(system_instruction, content, model=None):
+    """Stable hash of a normalized LLM request."""
+    payload = json.dumps(
+        {"model": model, "system": system_instruction.strip(), "content": content},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachingLLM(LLM):
+    """
+    Wraps any LLM and serves identical (system_instruction, history) requests from a local on-disk store.
+    The store is evicted least-recently-used first once it grows past max_bytes.
+    """
+    def __init__(self, llm: LLM, directory=".pocket_cache/llm", max_bytes=256 * 1024 * 1024):
+        self.llm = llm
+        self.model = f"{type(llm).__name__}:{getattr(llm, 'model', None)}"
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._size = sum(p.stat().st_size for p in self.directory.glob("*.txt"))
+
+    def _path(self, system_instruction, content):
+        return self.directory / f"{request_key(system_instruction, content, self.model)}.txt"
+
+    def _load(self, path):
+        try:
+            text = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(path)  # mtime doubles as last-used time for eviction
+        self.hits += 1
+        return text
+
+    def _store(self, path, text):
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+        self._size += path.stat().st_size
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        entries = sorted((p.stat().st_mtime, p.stat().st_size, p) for p in self.directory.glob("*.txt"))
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            p.unlink(missing_ok=True)
+            self._size -= size
+
+    def generate_response(self, system_instruction, content):
+        path = self._path(system_instruction, content)
+        text = self._load(path)
+        if text is None:
+            text = self.llm.generate_response(system_instruction, content)
+            self._store(path, text)
+        return text
+
+    async def agenerate_response(self, system_instruction, content):
+        path = self._path(system_instruction, content)
+        text = self._load(path)
+        if text is None:
+            text = await self.llm.agenerate_response(system_instruction, content)
+            self._store(path, text)
+        return text
+
+    async def stream_response(self, system_instruction, content):
+        path = self._path(system_instruction, content)
+        text = self._load(path)
+        if text is not None:
+            yield text
+            return
+
+        chunks = []
+        async with aclosing(self.llm.stream_response(system_instruction, content)) as inner:
+            try:
+                async for chunk in inner:
+                    chunks.append(chunk)
+                    yield chunk
+            except GeneratorExit:
+                # the consumer stopped early (Agent.astream does at the output step): read the rest so the
+                # response is still cached; failing that, the stream is just not cached
+                try:
+                    async for chunk in inner:
+                        chunks.append(chunk)
+                    self._store(path, "".join(chunks))
+                except Exception:
+                    pass
+                raise
+        self._store(path, "".join(chunks))
+
+
+class ReplayLLM(LLM):
+    """
+    Deterministic backend for tests, CI and benchmarks.
+
+    - ReplayLLM(path, llm=real_llm) records every request/response of real_llm to a JSONL file.
+    - ReplayLLM(path) plays a recording back: each request gets the response recorded for the same request.
+      With strict=False, unknown requests get the next unused recorded response instead of an error.
+    - ReplayLLM(responses=[...]) plays a scripted list of responses in order.
+    latency adds a fixed delay (seconds) per call to simulate a provider.
+    """
+    def __init__(self, path=None, responses=None, llm: LLM = None, strict=True, latency=0.0):
+        self.path = Path(path) if path else None
+        self.llm = llm
+        self.strict = strict
+        self.latency = latency
+        self.model = getattr(llm, "model", None)
+        self._by_key = {}
+        self._order = deque()
+
+        if llm is None:
+            if responses is not None:
+                entries = [{"key": None, "response": r} for r in responses]
+                self.strict = False
+            else:
+                with self.path.open(encoding="utf-8") as f:
+                    entries = [json.loads(line) for line in f if line.strip()]
+                self.model = entries[0].get("model") if entries else None
+
+            for entry in entries:
+                self._order.append(entry)
+                self._by_key.setdefault(entry["key"], deque()).append(entry)
+
+    def _replay(self, system_instruction, content):
+        key = request_key(system_instruction, content, self.model)
+        queue = self._by_key.get(key)
+        if queue:
+            entry = queue.popleft()
+        elif self.strict:
+            raise KeyError(f"No recorded response for request {key[:12]}")
+        else:
+            entry = next((e for e in self._order if not e.get("used")), None)
+            if entry is None:
+                raise KeyError("Recorded responses exhausted")
+            self._by_key[entry["key"]].remove(entry)
+        entry["used"] = True
+        return entry["response"]
+
+    def _record(self, system_instruction, content, response):
+        entry = {"key": request_key(system_instruction, content, self.model), "model": self.model, "response": response}
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def generate_response(self, system_instruction, content):
+        if self.llm is None:
+            return self._replay(system_instruction, content)
+        response = self.llm.generate_response(system_instruction, content)
+        self._record(system_instruction, content, response)
+        return response
+
+    async def agenerate_response(self, system_instruction, content):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.llm is None:
+            return self._replay(system_instruction, content)
+        response = await self.llm.agenerate_response(system_instruction, content)
+        self._record(system_instruction, content, response)
+        return response
+
+
+def default_phase(content):
+    """
+    Guess what the next model turn is for: "plan" when it answers a fresh user prompt (the protocol starts
+    with a plan), "output" otherwise (after observations the model may finish).
+    """
+    try:
+        last = json.loads(content[-1]["content"]).get("type")
+    except (IndexError, KeyError, TypeError, ValueError, AttributeError):
+        return "output"
+    return "plan" if last == "user" else "output"
+
+
+class _Backend:
+    def __init__(self, llm, alpha):
+        self.llm = llm
+        self.name = f"{type(llm).__name__}:{getattr(llm, 'model', None)}"
+        self.alpha = alpha
+        self.latency = None  # EWMA, seconds
+        self.error_rate = 0.0  # EWMA of failures
+        self.samples = deque(maxlen=200)
+        self.inflight = 0
+        self.last_error = 0.0
+
+    def errors(self):
+        # error rate fades with a 30s half-life, so a failing backend gets probed again later
+        return self.error_rate * 0.5 ** ((time.monotonic() - self.last_error) / 30)
+
+    def score(self):
+        # untried backends score 0 so they get sampled; errors weigh like a 5x slowdown plus 10s
+        errors = self.errors()
+        return (self.latency or 0.0) * (1 + 4 * errors) * (1 + self.inflight / 10) + 10 * errors
+
+    def record(self, latency=None, error=False):
+        a = self.alpha
+        self.error_rate = (1 - a) * self.error_rate + a * error
+        if error:
+            self.last_error = time.monotonic()
+        if latency is not None:
+            self.latency = latency if self.latency is None else (1 - a) * self.latency + a * latency
+            self.samples.append(latency)
+
+    def quantile(self, q):
+        values = sorted(self.samples)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def stats(self):
+        return {"latency": self.latency, "error_rate": self.errors(), "samples": len(self.samples),
+                "p95": self.quantile(0.95) if self.samples else None}
+
+
+class RouterLLM(LLM):
+    """
+    Routes each request across several backends by moving-average latency and error rate.
+
+    hedge: when the chosen backend has not answered after its own p95 latency (once min_samples are known),
+    the same request goes to the next best backend too; the first answer wins and the other is cancelled.
+    A backend that fails is recorded and the request fails over to the next one.
+    small: optional cheaper backends for "plan" turns; phase(content) decides the turn type (default_phase
+    looks at the last history step). Streaming picks one backend and does not hedge.
+    """
+    def __init__(self, backends, small=None, phase=default_phase, hedge=True, hedge_quantile=0.95, min_samples=20, alpha=0.2):
+        self.backends = [_Backend(llm, alpha) for llm in backends]
+        self.small = [_Backend(llm, alpha) for llm in small or []]
+        self.phase = phase
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.model = None
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _pool(self, content):
+        if self.small and self.phase(content) == "plan":
+            return self.small
+        return self.backends
+
+    def _ranked(self, content):
+        return sorted(self._pool(content), key=_Backend.score)
+
+    @staticmethod
+    def _trace(**attributes):
+        span = current_span()
+        if span is not None:
+            span.set(**attributes)
+
+    async def _timed(self, backend, system_instruction, content):
+        backend.inflight += 1
+        start = time.perf_counter()
+        try:
+            response = await backend.llm.agenerate_response(system_instruction, content)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            backend.record(error=True)
+            raise
+        finally:
+            backend.inflight -= 1
+        backend.record(time.perf_counter() - start)
+        return response
+
+    async def agenerate_response(self, system_instruction, content):
+        ranked = self._ranked(content)
+        error = None
+        while ranked:
+            primary = ranked.pop(0)
+            start = time.perf_counter()
+            task = asyncio.ensure_future(self._timed(primary, system_instruction, content))
+            tasks = {task: primary}
+            try:
+                if self.hedge and ranked and len(primary.samples) >= self.min_samples:
+                    done, _ = await asyncio.wait({task}, timeout=primary.quantile(self.hedge_quantile))
+                    if not done:
+                        backup = ranked.pop(0)
+                        self.hedges += 1
+                        tasks[asyncio.ensure_future(self._timed(backup, system_instruction, content))] = backup
+
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for finished in done:
+                        if finished.exception() is None:
+                            winner = tasks[finished]
+                            if winner is not primary:
+                                self.hedge_wins += 1
+                                # the primary is about to be cancelled: its latency is at least this long
+                                primary.record(time.perf_counter() - start)
+                            self._trace(backend=winner.name, hedged=len(tasks) > 1)
+                            return finished.result()
+                        error = finished.exception()
+            finally:
+                for t in tasks:
+                    t.cancel()
+        raise error or RuntimeError("RouterLLM has no backends")
+
+    def generate_response(self, system_instruction, content):
+        error = None
+        for backend in self._ranked(content):
+            start = time.perf_counter()
+            try:
+                response = backend.llm.generate_response(system_instruction, content)
+            except Exception as e:
+                backend.record(error=True)
+                error = e
+                continue
+            backend.record(time.perf_counter() - start)
+            return response
+        raise error or RuntimeError("RouterLLM has no backends")
+
+    async def stream_response(self, system_instruction, content):
+        backend = self._ranked(content)[0]
+        self._trace(backend=backend.name)
+        backend.inflight += 1
+        start = time.perf_counter()
+        try:
+            async for chunk in backend.llm.stream_response(system_instruction, content):
+                yield chunk
+        except Exception:
+            backend.record(error=True)
+            raise
+        finally:
+            backend.inflight -= 1
+        backend.record(time.perf_counter() - start)
+
+    def stats(self):
+        return {
+            "backends": {b.name: b.stats() for b in self.backends},
+            "small": {b.name: b.stats() for b in self.small},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
@@ -0,0 +1,49 @@
+import atexit
+import asyncio
+import threading
+import concurrent.futures
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def background_loop():
+    """One long-lived event loop in a daemon thread, shared by every synchronous caller. Started on first use."""
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="pocket-agent-loop", daemon=True)
+            thread.start()
+            _loop, _thread = loop, thread
+            atexit.register(_shutdown)
+    return _loop
+
+
+def _shutdown():
+    global _loop, _thread
+    with _lock:
+        if _loop is not None:
+            _loop.call_soon_threadsafe(_loop.stop)
+            _thread.join(5)
+            _loop, _thread = None, None
+
+
+def run_sync(coro, timeout=None):
+    """
+    Run a coroutine on the background loop and block the calling thread for its result.
+    Safe from any thread, including one that is itself running an event loop (that loop is blocked meanwhile).
+    On timeout the coroutine is cancelled and TimeoutError raised.
+    """
+    loop = background_loop()
+    if threading.current_thread() is _thread:
+        coro.close()
+        raise RuntimeError("run_sync() called from the background loop; await the coroutine instead")
+
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise TimeoutError(f"Timed out after {timeout}s")
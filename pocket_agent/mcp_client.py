@@ -1,26 +1,73 @@
+import json
 import asyncio
+import hashlib
+import logging
+from pathlib import Path
 from contextlib import AsyncExitStack
+from mcp import types
 from mcp.client.stdio import stdio_client, StdioServerParameters
 from mcp.client.session import ClientSession
 
+DEFAULT_CACHE_DIR = ".pocket_cache/mcp"
+
+logger = logging.getLogger(__name__)
+
+
+def _tools_cache_path(server_script_path: str, cache_dir) -> Path:
+    """Cache file for a server script, keyed by its absolute path and mtime."""
+    script = Path(server_script_path).resolve()
+    key = hashlib.sha256(f"{script}:{script.stat().st_mtime_ns}".encode()).hexdigest()
+    return Path(cache_dir) / f"{key}.json"
+
+
+def load_cached_tools(server_script_path: str, cache_dir=DEFAULT_CACHE_DIR):
+    """Tool listing cached by a previous run of this exact server script, or None."""
+    try:
+        data = json.loads(_tools_cache_path(server_script_path, cache_dir).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return [types.Tool.model_validate(tool) for tool in data]
+
 
 class MCPClient:
-    def __init__(self):
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
         self.exit_stack = AsyncExitStack()
         self.stdio = None
         self.write = None
         self.session = None
         self.tools = []
+        self.cache_dir = cache_dir
+        self._target = None
+        self._connect_lock = asyncio.Lock()
+        self._owner = None
+        self._closed = None
+        self._tool_listeners = []
+        self._tasks = set()
 
-    async def connect_to_local_server(self, server_script_path: str):
-        """Connect to an MCP server (.py or .js)"""
+    async def connect_to_local_server(self, server_script_path: str, lazy: bool = False):
+        """
+        Connect to an MCP server (.py or .js).
+        With lazy=True and a tool listing cached for this script (same path and mtime), the tools are available
+        immediately and the server is only spawned on the first call_tool.
+        """
         is_python = server_script_path.endswith(".py")
         is_js = server_script_path.endswith(".js")
 
         if not (is_python or is_js):
             raise ValueError("Server script must be a .py or .js file")
 
-        command = "python" if is_python else "node"
+        self._target = server_script_path
+        if lazy:
+            tools = load_cached_tools(server_script_path, self.cache_dir)
+            if tools is not None:
+                self.tools = tools
+                logger.debug("Loaded cached tools: %s", [t.name for t in self.tools])
+                return
+
+        await self._spawn_local_server(server_script_path)
+
+    async def _spawn_local_server(self, server_script_path: str):
+        command = "python" if server_script_path.endswith(".py") else "node"
         server_params = StdioServerParameters(
             command=command,
             args=[server_script_path],
@@ -31,18 +78,100 @@ class MCPClient:
             stdio_client(server_params)
         )
         self.stdio, self.write = stdio_transport
+        await self._start_session()
+
+    async def connect_to_url(self, url: str):
+        """Connect to an MCP server already listening locally (streamable HTTP transport)"""
+        from mcp.client.streamable_http import streamablehttp_client
+
+        self._target = url
+        self.stdio, self.write, _ = await self.exit_stack.enter_async_context(
+            streamablehttp_client(url)
+        )
+        await self._start_session()
+
+    async def connect(self, target: str, lazy: bool = False):
+        """Connect to a server script (.py / .js, spawned over stdio) or an http(s):// URL"""
+        if target.startswith(("http://", "https://")):
+            await self.connect_to_url(target)
+        else:
+            await self.connect_to_local_server(target, lazy=lazy)
 
+    async def _start_session(self):
         self.session = await self.exit_stack.enter_async_context(
-            ClientSession(self.stdio, self.write)
+            ClientSession(self.stdio, self.write, message_handler=self._handle_message)
         )
 
         await self.session.initialize()
 
         # List available tools
+        await self._list_tools()
+        logger.debug("Connected to server with tools: %s", [t.name for t in self.tools])
+
+    async def _list_tools(self):
         response = await self.session.list_tools()
         self.tools = response.tools
-        print("[DEBUG] Connected to server with tools:", [t.name for t in self.tools])
+
+        if self._target and not self._target.startswith(("http://", "https://")):
+            try:
+                path = _tools_cache_path(self._target, self.cache_dir)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(json.dumps([t.model_dump(mode="json") for t in self.tools]), encoding="utf-8")
+            except OSError as e:
+                logger.warning("Could not cache MCP tools: %s", e)
+
+    async def _handle_message(self, message):
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+            # list_tools can't be awaited here: this handler runs on the session's receive loop
+            task = asyncio.create_task(self.refresh_tools())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def refresh_tools(self):
+        """Re-list the server's tools, update the cache and notify on_tools_changed listeners"""
+        await self._list_tools()
+        for listener in self._tool_listeners:
+            listener(self)
+
+    def on_tools_changed(self, listener):
+        """Call listener(client) whenever the server's tool list changes"""
+        self._tool_listeners.append(listener)
+
+    async def _ensure_session(self):
+        if self.session is not None:
+            return
+        async with self._connect_lock:
+            if self.session is None:
+                # spawn from a dedicated task: the stdio contexts must be exited by the task that entered them,
+                # and the first call may come from any (short-lived) tool task
+                ready = asyncio.get_running_loop().create_future()
+                self._closed = asyncio.Event()
+                self._owner = asyncio.create_task(self._own_connection(ready))
+                await ready
+
+    async def _own_connection(self, ready):
+        try:
+            await self._spawn_local_server(self._target)
+            ready.set_result(None)
+            await self._closed.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            if not ready.done():
+                ready.cancel()
+            await self.exit_stack.aclose()
+
+    async def call_tool(self, name: str, arguments: dict):
+        """Call a tool and return its first text content (or None)"""
+        await self._ensure_session()
+        response = await self.session.call_tool(name, arguments)
+        return response.content[0].text if response.content else None
 
     async def close(self):
         """Gracefully close all resources"""
-        await self.exit_stack.aclose()
+        if self._owner is not None:
+            self._closed.set()
+            await asyncio.gather(self._owner, return_exceptions=True)
+        else:
+            await self.exit_stack.aclose()
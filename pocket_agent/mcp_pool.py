@@ -0,0 +1,191 @@
+import asyncio
+import logging
+
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+from .mcp_client import MCPClient, load_cached_tools
+
+NAMESPACE_SEP = "__"
+
+logger = logging.getLogger(__name__)
+
+
+class _Replica:
+    """
+    One MCP connection. The connection lives in its own task, so it can be torn down and restarted from
+    any other task (the stdio/anyio contexts must be exited by the task that entered them).
+    """
+    def __init__(self, target, on_tools_changed=None):
+        self.target = target
+        self.on_tools_changed = on_tools_changed
+        self.client = None
+        self.inflight = 0
+        self._task = None
+        self._stop = None
+        self._restarting = None
+
+    async def start(self):
+        ready = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(ready))
+        await ready
+
+    async def _run(self, ready):
+        client = MCPClient()
+        try:
+            await client.connect(self.target)
+            if self.on_tools_changed is not None:
+                client.on_tools_changed(self.on_tools_changed)
+            self.client = client
+            ready.set_result(None)
+            await self._stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            if not ready.done():
+                ready.cancel()
+            self.client = None
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+    async def stop(self):
+        if self._task is not None:
+            self._stop.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def restart(self):
+        # concurrent callers that saw the same crash share one restart
+        if self._restarting is None:
+            self._restarting = asyncio.ensure_future(self._restart())
+        try:
+            await asyncio.shield(self._restarting)
+        finally:
+            self._restarting = None
+
+    async def _restart(self):
+        logger.info("Restarting MCP server %s", self.target)
+        await self.stop()
+        await self.start()
+
+
+class _Server:
+    def __init__(self, name, target, replicas, namespace=True, on_tools_changed=None):
+        self.name = name
+        self.namespace = namespace
+        self.replicas = [_Replica(target, self._tools_changed) for _ in range(replicas)]
+        self.tools = []
+        self.on_tools_changed = on_tools_changed
+
+    def _tools_changed(self, client):
+        # every replica hears the same tools/list_changed; each one just re-applies the same listing
+        self.tools = client.tools
+        if self.on_tools_changed is not None:
+            self.on_tools_changed(self)
+
+    async def start(self, lazy=False):
+        target = self.replicas[0].target
+        if lazy and not target.startswith(("http://", "https://")):
+            tools = load_cached_tools(target)
+            if tools is not None:
+                # replicas are spawned by the first call_tool that lands on them
+                self.tools = tools
+                return
+
+        await asyncio.gather(*(replica.start() for replica in self.replicas))
+        self.tools = self.replicas[0].client.tools
+
+    async def call_tool(self, name, arguments):
+        replica = min(self.replicas, key=lambda r: r.inflight)
+        replica.inflight += 1
+        try:
+            for attempt in range(2):
+                if replica.client is None:
+                    await replica.restart()
+                try:
+                    return await replica.client.call_tool(name, arguments)
+                except McpError as e:
+                    # a dead server process fails the requests in flight with CONNECTION_CLOSED;
+                    # any other code is a protocol error from a live server
+                    if e.error.code != CONNECTION_CLOSED or attempt:
+                        raise
+                    await replica.restart()
+                except Exception:
+                    if attempt:
+                        raise
+                    await replica.restart()
+        finally:
+            replica.inflight -= 1
+
+    async def close(self):
+        await asyncio.gather(*(replica.stop() for replica in self.replicas))
+
+
+class MCPPool:
+    """
+    Several MCP servers at once, each with N connection replicas.
+
+    Tools are namespaced as "<server>__<tool>" and calls go to the least busy replica of their server.
+    A replica whose connection fails is restarted and the call retried once.
+    Has the same `tools` / `call_tool` / `on_tools_changed` interface as MCPClient, so it can be passed to
+    Agent.register_mcp; a tools/list_changed notification from any server rebuilds `tools` and notifies listeners.
+    """
+    def __init__(self):
+        self.servers = {}
+        self.tools = []
+        self._routes = {}
+        self._tool_listeners = []
+
+    def on_tools_changed(self, listener):
+        """Call listener(pool) whenever the tool list of one of the pool's servers changes"""
+        self._tool_listeners.append(listener)
+
+    def _exposed(self, server, tool):
+        return f"{server.name}{NAMESPACE_SEP}{tool.name}" if server.namespace else tool.name
+
+    def _server_tools_changed(self, server):
+        tools, routes = [], {}
+        for srv in self.servers.values():
+            for tool in srv.tools:
+                exposed = self._exposed(srv, tool)
+                if exposed in routes:
+                    logger.warning("Duplicate MCP tool name %r from server %r ignored", exposed, srv.name)
+                    continue
+                routes[exposed] = (srv, tool.name)
+                tools.append(tool.model_copy(update={"name": exposed}))
+        self.tools, self._routes = tools, routes
+        for listener in self._tool_listeners:
+            listener(self)
+
+    async def add_server(self, name: str, target: str, replicas: int = 1, namespace: bool = True, lazy: bool = False):
+        """
+        target: a server script (.py / .js, spawned over stdio) or the http(s):// URL of a running server.
+        lazy: use the tool listing cached for this script and start the replicas on first use.
+        """
+        if name in self.servers:
+            raise ValueError(f"MCP server {name!r} already added")
+
+        server = _Server(name, target, replicas, namespace, self._server_tools_changed)
+        await server.start(lazy)
+        self.servers[name] = server
+
+        for tool in server.tools:
+            exposed = self._exposed(server, tool)
+            if exposed in self._routes:
+                raise ValueError(f"Duplicate MCP tool name {exposed!r}")
+            self._routes[exposed] = (server, tool.name)
+            self.tools.append(tool.model_copy(update={"name": exposed}))
+
+    async def call_tool(self, name: str, arguments: dict):
+        server, tool_name = self._routes[name]
+        return await server.call_tool(tool_name, arguments)
+
+    async def close(self):
+        await asyncio.gather(*(server.close() for server in self.servers.values()))
+        self.servers.clear()
+        self.tools = []
+        self._routes.clear()
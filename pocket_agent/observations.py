@@ -0,0 +1,131 @@
+import re
+import json
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+
+HANDLE_PREFIX = "obs:"
+LINE_MAX_CHARS = 500  # per line returned by observation_grep / observation_page
+
+
+def to_text(value):
+    """Tool result as text: strings unchanged, anything else as JSON (non-serialisable parts via str)."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+class ObservationStore:
+    """
+    Content-addressed store for large tool results, so they are not copied into every later LLM request.
+
+    wrap() keeps results over threshold_chars here and returns a short stand-in for the history: a handle, the
+    size and a preview. The model reads more through the observation_slice / observation_grep /
+    observation_page tools (see tools()). Texts stay in memory up to max_memory_bytes (LRU); older ones spill
+    to files in spill_dir and are read back on demand. Identical results share one entry.
+    """
+    def __init__(self, threshold_chars=4000, preview_chars=500, max_memory_bytes=64 * 1024 * 1024,
+                 spill_dir=".pocket_cache/observations"):
+        self.threshold_chars = threshold_chars
+        self.preview_chars = preview_chars
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = Path(spill_dir)
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._spilled = set()
+
+    def __contains__(self, handle):
+        return handle in self._memory or handle in self._spilled
+
+    def put(self, text: str) -> str:
+        data = text.encode("utf-8")
+        handle = HANDLE_PREFIX + hashlib.sha256(data).hexdigest()[:16]
+        if handle in self._memory:
+            self._memory.move_to_end(handle)
+        elif handle not in self._spilled:
+            self._memory[handle] = text
+            self._memory_bytes += len(data)
+            self._spill()
+        return handle
+
+    def _spill(self):
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            handle, text = self._memory.popitem(last=False)
+            data = text.encode("utf-8")
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            (self.spill_dir / f"{handle[len(HANDLE_PREFIX):]}.txt").write_bytes(data)
+            self._spilled.add(handle)
+            self._memory_bytes -= len(data)
+
+    def get(self, handle: str) -> str:
+        text = self._memory.get(handle)
+        if text is not None:
+            self._memory.move_to_end(handle)
+            return text
+        if handle in self._spilled:
+            return (self.spill_dir / f"{handle[len(HANDLE_PREFIX):]}.txt").read_text(encoding="utf-8")
+        raise KeyError(f"Unknown observation handle {handle!r}")
+
+    def wrap(self, value):
+        """The observation to record for a tool result: small JSON values as-is, large ones as a handle."""
+        text = to_text(value)
+        if len(text) <= self.threshold_chars:
+            return value if text is value or _is_json(value) else text
+        return {
+            "handle": self.put(text),
+            "chars": len(text),
+            "lines": text.count("\n") + 1,
+            "preview": text[:self.preview_chars],
+            "note": "Truncated. Read more with observation_slice, observation_grep or observation_page.",
+        }
+
+    # tools the model uses on handles
+
+    def slice(self, handle: str, start: int = 0, length: int = 2000):
+        """Characters [start, start + length) of a stored observation."""
+        text = self.get(handle)
+        length = max(0, min(length, self.threshold_chars))
+        return {"text": text[start:start + length], "start": start, "end": min(len(text), start + length), "chars": len(text)}
+
+    def grep(self, handle: str, pattern: str, max_matches: int = 20, context: int = 0):
+        """Lines of a stored observation matching a regular expression (case-insensitive), with line numbers."""
+        lines = self.get(handle).splitlines()
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+        except re.error:
+            regex = re.compile(re.escape(pattern), re.IGNORECASE)
+
+        matches = []
+        for number, line in enumerate(lines):
+            if regex.search(line):
+                lo, hi = max(0, number - context), min(len(lines), number + context + 1)
+                matches.append({"line": number + 1, "text": "\n".join(l[:LINE_MAX_CHARS] for l in lines[lo:hi])})
+                if len(matches) >= max_matches:
+                    break
+        return {"matches": matches, "truncated": len(matches) >= max_matches}
+
+    def page(self, handle: str, page: int = 1, page_size: int = 50):
+        """Page of lines (1-based page) of a stored observation."""
+        lines = self.get(handle).splitlines()
+        page, page_size = max(1, page), min(max(1, page_size), 200)
+        start = (page - 1) * page_size
+        # long lines are cut so one page never brings the whole result back into the history
+        return {"lines": [line[:LINE_MAX_CHARS] for line in lines[start:start + page_size]], "page": page,
+                "pages": (len(lines) + page_size - 1) // page_size, "total_lines": len(lines)}
+
+    def tools(self):
+        """(name, function) pairs, registered as tools by Agent(observation_store=...)."""
+        return [("observation_slice", self.slice), ("observation_grep", self.grep), ("observation_page", self.page)]
+
+    def stats(self):
+        return {"memory_entries": len(self._memory), "memory_bytes": self._memory_bytes, "spilled_entries": len(self._spilled)}
+
+
+def _is_json(value):
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return False
+    return True
@@ -0,0 +1,134 @@
+import re
+import time
+import random
+import asyncio
+from contextvars import ContextVar
+
+from .tracing import current_span
+
+# limiter applied to the LLM calls of the conversation running in this context (set by Agent.abatch)
+current_limiter = ContextVar("pocket_agent_limiter", default=None)
+
+_RATE_LIMIT_MESSAGE = re.compile(r"\b429\b|rate.?limit|too many requests", re.IGNORECASE)
+
+
+def is_rate_limited(exc):
+    """True for provider 429 / rate limit errors (SDK exceptions carry status_code or status; wrapped ones only a message)."""
+    for e in (exc, exc.__cause__, exc.__context__):
+        if e is None:
+            continue
+        if getattr(e, "status_code", None) == 429 or getattr(e, "status", None) == 429:
+            return True
+        if _RATE_LIMIT_MESSAGE.search(str(e)):
+            return True
+    return False
+
+
+def retry_after(exc):
+    """Seconds from a Retry-After header on the error's HTTP response, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bucket:
+    """Token bucket refilled continuously at per_minute / 60 per second, holding at most one minute's worth."""
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        self._refill()
+        # a single request larger than the bucket waits for a full bucket instead of forever
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+
+class RateLimiter:
+    """
+    Admission control for one provider: requests per minute and (estimated) tokens per minute.
+
+    Callers are admitted in FIFO order. Each request is charged its estimated input tokens up front and settled
+    with the usage the provider reports. A 429 pauses every caller of the limiter and the request is retried
+    with exponential backoff (or the server's Retry-After), up to max_retries times.
+    """
+    _shared = {}
+
+    def __init__(self, rpm=None, tpm=None, max_retries=5, backoff=1.0, max_backoff=60.0):
+        self.requests = _Bucket(rpm) if rpm else None
+        self.tokens = _Bucket(tpm) if tpm else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retries = 0
+        self._paused_until = 0.0
+        self._lock = None
+
+    @classmethod
+    def shared(cls, llm, **limits):
+        """One limiter per provider and model, shared by every agent and batch that uses it."""
+        key = (type(llm).__name__, getattr(llm, "model", None))
+        if key not in cls._shared:
+            cls._shared[key] = cls(**limits)
+        return cls._shared[key]
+
+    async def acquire(self, tokens=0):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                wait = max(
+                    self._paused_until - time.monotonic(),
+                    self.requests.wait_time(1) if self.requests else 0.0,
+                    self.tokens.wait_time(tokens) if self.tokens else 0.0,
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+
+    def settle(self, extra_tokens):
+        """Charge (or refund) the difference between the estimate and the actual usage."""
+        if self.tokens and extra_tokens:
+            self.tokens.take(extra_tokens)
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def call(self, func, *args, tokens=0, **kwargs):
+        """await func(*args, **kwargs) once admitted, retrying rate-limited attempts."""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(tokens)
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limited(e):
+                    raise
+                delay = retry_after(e) or min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+                self.retries += 1
+                self.pause(delay)
+                continue
+
+            span = current_span()
+            if span is not None and attempt:
+                span.set(retries=attempt)
+            if span is not None and "input_tokens" in span.attributes:
+                used = span.attributes["input_tokens"] + span.attributes.get("output_tokens", 0)
+                self.settle(used - tokens)
+            return result
@@ -0,0 +1,350 @@
+"""
+HTTP entry point for an Agent: plain asyncio, no web framework.
+
+    python -m pocket_agent.serve myapp:create_agent --port 8000 --workers 4 --sessions .pocket_sessions
+
+`myapp:create_agent` is a function (sync or async) returning a configured Agent. Each worker process calls it
+once, so one agent, tool registry and MCP pool serve every request of that worker.
+
+Endpoints:
+    POST /invoke   {"prompt": "...", "session_id": "..."?, "timeout": 30?, "max_steps": 10?, "max_tokens": 20000?}
+                   ->  {"output": ..., "stop_reason": "output" | "max_steps" | ..., "session_id": ...}
+    POST /stream   same body; Server-Sent Events, one `step` event per plan/action/observation/output, then `done`
+                   (a run stopped by a budget ends with a {"type": "stop", "reason": ...} step)
+    GET  /health   {"status": "ok" | "draining", "pid": ..., "inflight": ...}
+    GET  /metrics  Prometheus text from the agent's tracer
+
+SIGTERM / SIGINT drain gracefully: stop accepting, let requests in flight finish (up to --grace seconds),
+then close the agent's MCP clients and save the sessions.
+"""
+
+import os
+import sys
+import re
+import json
+import socket
+import signal
+import asyncio
+import inspect
+import argparse
+import importlib
+from contextlib import aclosing, nullcontext
+
+from .session import SessionStore
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADERS = 100
+KEEPALIVE_SECONDS = 75
+SESSION_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")  # ids end up in file names under --sessions
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+            431: "Request Header Fields Too Large",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or _REASONS.get(status, ""))
+        self.status = status
+
+
+async def _readline(reader):
+    try:
+        return await reader.readline()
+    except ValueError:
+        # longer than the StreamReader limit (64 KiB)
+        raise HTTPError(431, "Request line or header too long")
+
+
+async def _read_request(reader):
+    """(method, path, headers, body) of the next request on the connection, or None at EOF."""
+    line = await _readline(reader)
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await _readline(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(400, "Too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+def _response(status, body, content_type="application/json", keep_alive=True):
+    if not isinstance(body, bytes):
+        body = (json.dumps(body, default=str) if content_type == "application/json" else body).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+class AgentServer:
+    """Serves one Agent over HTTP/1.1 (keep-alive). Use with asyncio.start_server(server.handle, ...)."""
+    def __init__(self, agent, sessions=None):
+        self.agent = agent
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.draining = False
+        self._connections = set()
+        self._busy = set()
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while not self.draining:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEPALIVE_SECONDS)
+                except HTTPError as e:
+                    writer.write(_response(e.status, {"error": str(e)}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+
+                self._busy.add(task)
+                try:
+                    keep_alive = await self._dispatch(*request, writer)
+                finally:
+                    self._busy.discard(task)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _dispatch(self, method, path, headers, body, writer):
+        keep_alive = headers.get("connection", "").lower() != "close"
+        routes = {"/invoke": ("POST", self._invoke), "/stream": ("POST", self._stream),
+                  "/health": ("GET", self._health), "/metrics": ("GET", self._metrics)}
+        try:
+            if path not in routes:
+                raise HTTPError(404)
+            allowed, handler = routes[path]
+            if method != allowed:
+                raise HTTPError(405)
+            if self.draining and path in ("/invoke", "/stream"):
+                raise HTTPError(503, "Server is shutting down")
+            return await handler(body, writer, keep_alive)
+        except HTTPError as e:
+            writer.write(_response(e.status, {"error": str(e)}, keep_alive=keep_alive))
+        except ConnectionError:
+            raise
+        except Exception as e:
+            self.agent.tracer.log(f"Request to {path} failed: {e}", level="ERROR")
+            writer.write(_response(500, {"error": str(e)}, keep_alive=keep_alive))
+        return keep_alive
+
+    def _parse(self, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON")
+        if not isinstance(request, dict) or not isinstance(request.get("prompt"), str):
+            raise HTTPError(400, 'Expected {"prompt": "...", "session_id": "..."}')
+        budgets = {}
+        for key in ("timeout", "max_steps", "max_tokens"):
+            value = request.get(key)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                raise HTTPError(400, f"{key} must be a positive number")
+            budgets[key] = value
+        session_id = request.get("session_id")
+        if session_id is not None and not (isinstance(session_id, str) and SESSION_ID.fullmatch(session_id)):
+            raise HTTPError(400, "session_id must be 1-64 letters, digits, '_' or '-'")
+        return request["prompt"], session_id, budgets
+
+    def _session(self, session_id):
+        # held for the whole request: concurrent requests on one session share it (and its lock) and run in turn
+        return self.sessions.hold(session_id) if session_id else nullcontext()
+
+    async def _invoke(self, body, writer, keep_alive):
+        prompt, session_id, budgets = self._parse(body)
+        with self._session(session_id) as session:
+            # cancelling this handler (shutdown past the grace period) cancels the run and its tool calls
+            result = await self.agent.arun(prompt, session=session, **budgets)
+            if session is not None:
+                self.sessions.save(session)
+        writer.write(_response(200, {"output": result.output, "stop_reason": result.stop_reason,
+                                     "session_id": session.id if session else None}, keep_alive=keep_alive))
+        return keep_alive
+
+    async def _stream(self, body, writer, keep_alive):
+        prompt, session_id, budgets = self._parse(body)
+        with self._session(session_id) as session:
+            return await self._stream_session(prompt, session, budgets, writer)
+
+    async def _stream_session(self, prompt, session, budgets, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        # a client that disconnects makes drain() raise, which closes the stream and cancels its tool calls
+        try:
+            async with aclosing(self.agent.astream(prompt, session=session, **budgets)) as steps:
+                async for step in steps:
+                    writer.write(_sse("step", step))
+                    await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # headers are already sent: report in-band
+            writer.write(_sse("error", {"error": str(e)}))
+            return False
+        if session is not None:
+            self.sessions.save(session)
+        writer.write(_sse("done", {"session_id": session.id if session else None}))
+        return False
+
+    async def _health(self, body, writer, keep_alive):
+        status = "draining" if self.draining else "ok"
+        writer.write(_response(200, {"status": status, "pid": os.getpid(), "inflight": len(self._busy)}, keep_alive=keep_alive))
+        return keep_alive
+
+    async def _metrics(self, body, writer, keep_alive):
+        writer.write(_response(200, self.agent.tracer.metrics.render_prometheus(), "text/plain; version=0.0.4", keep_alive))
+        return keep_alive
+
+    async def shutdown(self, server, grace=30.0):
+        """Stop accepting, close idle keep-alive connections, wait up to grace seconds for requests in flight."""
+        self.draining = True
+        server.close()
+        for task in self._connections - self._busy:
+            task.cancel()
+        if self._busy:
+            await asyncio.wait(set(self._busy), timeout=grace)
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+
+async def _load_agent(factory):
+    agent = factory()
+    if inspect.isawaitable(agent):
+        agent = await agent
+    return agent
+
+
+async def _worker(factory, sock, sessions, grace):
+    agent = await _load_agent(factory)
+    app = AgentServer(agent, sessions)
+    server = await asyncio.start_server(app.handle, sock=sock)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"[pocket-agent] worker {os.getpid()} serving on {sock.getsockname()}")
+    await stop.wait()
+    await app.shutdown(server, grace)
+    for client in agent.mcp:
+        await client.close()
+    sessions.close()
+
+
+def serve(factory, host="127.0.0.1", port=8000, workers=1, sessions_dir=None, grace=30.0):
+    """
+    Serve factory() (an Agent, or a coroutine returning one) on host:port.
+    With workers > 1 the listening socket is bound once and shared by forked worker processes (POSIX only), each
+    with its own agent and event loop; crashed workers are replaced. Sessions are then only consistent across
+    workers through sessions_dir: a request reloads its session from disk unless another request of the same
+    worker is using it. Concurrent requests on one session in different workers still overwrite each other.
+    """
+    sock = socket.create_server((host, port), backlog=1024)
+    sock.setblocking(False)
+
+    def sessions():
+        if workers > 1 and sessions_dir:
+            return SessionStore(sessions_dir, reload=True)
+        return SessionStore(sessions_dir)
+
+    if workers <= 1:
+        asyncio.run(_worker(factory, sock, sessions(), grace))
+        return
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                asyncio.run(_worker(factory, sock, sessions(), grace))
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"[pocket-agent] worker {pid} exited ({status}), restarting")
+            spawn()
+    sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("factory", help="module:function returning an Agent (may be async)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sessions", default=None, help="directory to persist sessions in")
+    parser.add_argument("--grace", type=float, default=30.0, help="seconds to let requests finish on shutdown")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    module, _, attr = args.factory.partition(":")
+    factory = getattr(importlib.import_module(module), attr or "create_agent")
+    serve(factory, args.host, args.port, args.workers, args.sessions, args.grace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import json
+import asyncio
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from .history import History
+
+
+class AgentSession:
+    """
+    A conversation that outlives a single ainvoke: history, observations and tool results carry over to the
+    next prompt. Pass it to Agent.ainvoke / Agent.astream with `session=`.
+    """
+    def __init__(self, session_id=None, history=None):
+        self.id = session_id or uuid.uuid4().hex
+        self.history = history if history is not None else History()
+        self.lock = asyncio.Lock()
+
+    def save(self, path):
+        """Write the session as JSONL: a header line, then one step per line."""
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            f.write(json.dumps({"session_id": self.id}) + "\n")
+            for step in self.history.steps:
+                f.write(json.dumps(step, default=str) + "\n")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with Path(path).open(encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            session = cls(session_id=header["session_id"])
+            for line in f:
+                if line.strip():
+                    session.history.append(json.loads(line))
+        return session
+
+
+class SessionStore:
+    """
+    Many sessions in one process. At most `max_active` sessions stay in memory (LRU); evicted ones are saved
+    under `directory` (if given) and reloaded on the next get(). Sessions in use (see hold()) or with a run in
+    progress are never evicted, so concurrent prompts on one session keep sharing its lock.
+
+    reload=True is for several processes sharing `directory`: get() re-reads a session from disk unless it is
+    in use in this process. Concurrent requests on one session in different processes still overwrite each other.
+    """
+    def __init__(self, directory=None, max_active=1024, reload=False):
+        self.directory = Path(directory) if directory else None
+        self.max_active = max_active
+        self.reload = reload
+        self._active = OrderedDict()
+        self._holds = {}
+
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, session_id):
+        path = (self.directory / f"{session_id}.jsonl").resolve()
+        if path.parent != self.directory.resolve():
+            raise ValueError(f"Invalid session id {session_id!r}")
+        return path
+
+    def _in_use(self, session):
+        return self._holds.get(session.id, 0) > 0 or session.lock.locked()
+
+    def get(self, session_id=None):
+        """Return the session with this id, loading or creating it as needed."""
+        session = self._active.get(session_id)
+        on_disk = session_id and self.directory and self._path(session_id).exists()
+        if session is not None and not (self.reload and on_disk and not self._in_use(session)):
+            self._active.move_to_end(session_id)
+            return session
+
+        session = AgentSession.load(self._path(session_id)) if on_disk else AgentSession(session_id)
+        self._active[session.id] = session
+        self._active.move_to_end(session.id)
+        self._evict()
+        return session
+
+    def _evict(self):
+        excess = len(self._active) - self.max_active
+        for session_id in list(self._active):
+            if excess <= 0:
+                break
+            session = self._active[session_id]
+            if self._in_use(session):
+                continue
+            del self._active[session_id]
+            self._persist(session)
+            excess -= 1
+
+    @contextmanager
+    def hold(self, session_id=None):
+        """get() the session and keep it in memory (and its lock shared) until the block exits."""
+        session = self.get(session_id)
+        self._holds[session.id] = self._holds.get(session.id, 0) + 1
+        try:
+            yield session
+        finally:
+            self._holds[session.id] -= 1
+            if not self._holds[session.id]:
+                del self._holds[session.id]
+            self._evict()
+
+    def save(self, session):
+        self._persist(session)
+
+    def _persist(self, session):
+        if self.directory:
+            session.save(self._path(session.id))
+
+    def drop(self, session_id):
+        self._active.pop(session_id, None)
+        if self.directory:
+            self._path(session_id).unlink(missing_ok=True)
+
+    def close(self):
+        """Save every active session."""
+        for session in self._active.values():
+            self._persist(session)
+
+    def __len__(self):
+        return len(self._active)
+
+    def __contains__(self, session_id):
+        return session_id in self._active
@@ -29,3 +29,11 @@ START
 {{ "type": "observation", "observation": "24°C" }}
 {{ "type": "output", "output": "The sum of weather of Patiala and Mohali is 24°C" }}
 """
+
+# Native tool calling: tools are declared through the provider's API, so no schema listing or transcript example.
+NATIVE_SYSTEM_PROMPT_TEMPLATE = """
+{context}
+Use the provided tools whenever they help; call independent tools together in one turn.
+Earlier turns appear as JSON steps: "action" is a tool call you made and "observation" its result.
+When you have everything you need, reply to the user's request directly in plain text.
+"""
@@ -1,40 +1,138 @@
-import inspect, json, asyncio
+import inspect, json, asyncio, types, typing
+
+from .cache import cache_key
+from .executor import default_process_executor
+from .loop import run_sync
+
+MODES = ("inline", "thread", "process")
 
 class Tool:
-    def __init__(self, func, name, description, schema):
+    def __init__(self, func, name, description, schema, cache=None, mode="thread", timeout=None, executor=None):
+        """
+        mode: how a sync tool runs under acall: "inline" on the event loop (trivial tools only), "thread" in the
+        default executor, or "process" in a ProcessExecutor (CPU-bound / untrusted code; killable on timeout).
+        timeout: per-call limit in seconds.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
         self.callable = func
         self.name = name or func.__name__
         self.description = description or inspect.getdoc(func) or "No description available"
         self.schema = schema
+        self.cache = cache
+        self.mode = mode
+        self.timeout = timeout
+        self.executor = executor
+        self._rendered = {}
+        self._parameters = None
 
     def call(self, tool_input):
-        if inspect.iscoroutinefunction(self.callable):
-            try:
-                loop = asyncio.get_running_loop()
-            except RuntimeError:
-                return asyncio.run(self.callable(**tool_input))
-            else:
-                return loop.run_until_complete(self.callable(**tool_input))
-        else:
+        """Synchronous call. Plain sync tools run directly; anything else goes through the shared background loop."""
+        if not inspect.iscoroutinefunction(self.callable) and self.cache is None and self.mode != "process":
             return self.callable(**tool_input)
+        return run_sync(self.acall(tool_input))
 
     async def acall(self, tool_input):
+        if self.cache is not None:
+            return await self.cache.aget_or_call(cache_key(self.name, tool_input), lambda: self._acall(tool_input))
+        return await self._acall(tool_input)
+
+    async def _acall(self, tool_input):
         if inspect.iscoroutinefunction(self.callable):
-            return await self.callable(**tool_input)
+            return await asyncio.wait_for(self.callable(**tool_input), self.timeout)
+        elif self.mode == "process":
+            executor = self.executor or default_process_executor()
+            return await executor.run(self.callable, tool_input, self.timeout)
+        elif self.mode == "inline":
+            return self.callable(**tool_input)
         else:
             loop = asyncio.get_running_loop()
-            return await loop.run_in_executor(None, lambda: self.callable(**tool_input))
+            # a thread can't be killed: on timeout the call is abandoned, not stopped
+            return await asyncio.wait_for(loop.run_in_executor(None, lambda: self.callable(**tool_input)), self.timeout)
 
     
-    def __str__(self):
-        if self.schema:
-            schema_str = json.dumps(self.schema, indent=2)
-        else:
-            sig = str(inspect.signature(self.callable))
-            schema_str = f"Parameters: {sig}"
-        
-        return f"""Tool: {self.name}
+    def render(self, compact=False):
+        """
+        Render the tool for the system prompt. Output is cached and byte-stable (sorted keys) so provider-side
+        prompt caching can hit. compact drops schema titles and whitespace to save prompt tokens.
+        """
+        if compact not in self._rendered:
+            if self.schema:
+                if compact:
+                    schema_str = json.dumps(_strip_titles(self.schema), separators=(",", ":"), sort_keys=True)
+                else:
+                    schema_str = json.dumps(self.schema, indent=2, sort_keys=True)
+            else:
+                sig = str(inspect.signature(self.callable))
+                schema_str = f"Parameters: {sig}"
+
+            if compact:
+                self._rendered[compact] = f"Tool: {self.name}\nDescription: {self.description}\nInput Schema: {schema_str}\n"
+            else:
+                self._rendered[compact] = f"""Tool: {self.name}
 Description: {self.description}
 Input Schema:
 {schema_str}
-"""
\ No newline at end of file
+"""
+        return self._rendered[compact]
+
+    @property
+    def parameters(self):
+        """JSON schema of the input: the given schema, or one derived from the function signature."""
+        if self._parameters is None:
+            self._parameters = _strip_titles(self.schema) if self.schema else signature_schema(self.callable)
+        return self._parameters
+
+    def spec(self):
+        """Provider-neutral declaration for native tool calling."""
+        return {"name": self.name, "description": self.description, "parameters": self.parameters}
+
+    def __str__(self):
+        return self.render()
+
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", tuple: "array",
+               set: "array", dict: "object"}
+
+
+def _annotation_schema(annotation):
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin in (typing.Union, types.UnionType):
+        options = [_annotation_schema(a) for a in args if a is not type(None)]
+        return options[0] if len(options) == 1 else {"anyOf": options}
+    if origin is typing.Literal:
+        return {"enum": list(args)}
+    if origin in (list, tuple, set):
+        return {"type": "array", "items": _annotation_schema(args[0])} if args else {"type": "array"}
+    if origin is dict:
+        return {"type": "object"}
+    return {"type": _JSON_TYPES[annotation]} if annotation in _JSON_TYPES else {}
+
+
+def signature_schema(func):
+    """JSON schema for a function's keyword arguments, from its type hints (unannotated arguments accept anything)."""
+    try:
+        hints = typing.get_type_hints(func)
+    except Exception:
+        hints = {}
+
+    properties, required = {}, []
+    for name, param in inspect.signature(func).parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        prop = _annotation_schema(hints[name]) if name in hints else {}
+        if param.default is param.empty:
+            required.append(name)
+        elif isinstance(param.default, (str, int, float, bool)):
+            prop["default"] = param.default
+        properties[name] = prop
+    return {"type": "object", "properties": properties, "required": required}
+
+
+def _strip_titles(schema):
+    # "title" annotations (added by pydantic/FastMCP) repeat the property names; a property *named* title maps to a dict
+    if isinstance(schema, dict):
+        return {k: _strip_titles(v) for k, v in schema.items() if not (k == "title" and isinstance(v, str))}
+    if isinstance(schema, list):
+        return [_strip_titles(v) for v in schema]
+    return schema
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_current_span = ContextVar("pocket_agent_span", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# numeric span attributes that are also accumulated as <name>_total counters
+COUNTED_ATTRIBUTES = ("input_tokens", "output_tokens")
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def use_span(span):
+    """Make span the current span for the enclosed block (parent of new spans, target of record_usage)."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+def record_usage(input_tokens=None, output_tokens=None):
+    """Attach provider-reported token usage to the LLM span in progress, if any."""
+    span = _current_span.get()
+    if span is not None:
+        if input_tokens is not None:
+            span.attributes["input_tokens"] = input_tokens
+        if output_tokens is not None:
+            span.attributes["output_tokens"] = output_tokens
+
+
+class Span:
+    """A timed operation. Fields follow the OpenTelemetry span data model (ids as hex, times in unix nanoseconds)."""
+    def __init__(self, tracer, name, parent=None, labels=None, **attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent.span_id if parent else None
+        self.labels = labels or {}
+        self.attributes = {**self.labels, **attributes}
+        self.events = []
+        self.status = "OK"
+        self.start_time = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self, name, **attributes):
+        self.events.append({"name": name, "time_unix_nano": time.time_ns(), "attributes": attributes})
+
+    def error(self, exc):
+        self.status = "ERROR"
+        self.attributes["error"] = f"{type(exc).__name__}: {exc}"
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+            self.tracer._finish(self)
+
+    def to_dict(self):
+        return {
+            "kind": "span",
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time,
+            "end_time_unix_nano": self.start_time + int((self.duration or 0) * 1e9),
+            "duration_seconds": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class Metrics:
+    """Counters and histograms with labels, rendered in the Prometheus text format."""
+    def __init__(self, prefix="pocket_agent"):
+        self.prefix = prefix
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters), {k: {**v, "buckets": list(v["buckets"])} for k, v in self._histograms.items()}
+
+    def render_prometheus(self):
+        counters, histograms = self.snapshot()
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        lines = []
+        for name in sorted({n for n, _ in counters}):
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{self.prefix}_{name}{fmt(labels)} {value}")
+        for name in sorted({n for n, _ in histograms}):
+            lines.append(f"# TYPE {self.prefix}_{name} histogram")
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, hist["buckets"]):
+                    lines.append(f"{self.prefix}_{name}_bucket{fmt(labels, [('le', bound)])} {count}")
+                lines.append(f"{self.prefix}_{name}_bucket{fmt(labels, [('le', '+Inf')])} {hist['count']}")
+                lines.append(f"{self.prefix}_{name}_sum{fmt(labels)} {hist['sum']}")
+                lines.append(f"{self.prefix}_{name}_count{fmt(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class ConsoleExporter:
+    """Prints log records (the agent's former debug prints). Spans are not printed."""
+    def export_log(self, record):
+        extra = " ".join(f"{k}={v}" for k, v in record["attributes"].items())
+        print(f"[{record['level']}] {record['message']}" + (f" {extra}" if extra else ""))
+
+    def export_span(self, span):
+        pass
+
+
+class JSONLExporter:
+    """Appends every finished span and log record to a JSONL file."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def export_log(self, record):
+        self._write(record)
+
+    def export_span(self, span):
+        self._write(span.to_dict())
+
+
+class Tracer:
+    """
+    Structured tracing and metrics for the agent loop.
+
+    span() times an operation and nests under the span active in the current context. Every finished span feeds
+    the `<name>_seconds` histogram (labelled by its labels) and the token counters in `metrics`, then goes to
+    each exporter. log() replaces print on the hot path. Callbacks in `on_span` are called with each finished span.
+    prices: model -> (USD per million input tokens, USD per million output tokens), adds cost_usd to LLM spans.
+    """
+    def __init__(self, exporters=None, metrics=None, prices=None):
+        self.exporters = [ConsoleExporter()] if exporters is None else list(exporters)
+        self.metrics = metrics or Metrics()
+        self.prices = prices or {}
+        self.on_span = []
+
+    def start_span(self, name, parent=None, labels=None, **attributes):
+        """A span not bound to the current context (for async generators); call end() on it."""
+        return Span(self, name, parent if parent is not None else _current_span.get(), labels, **attributes)
+
+    @contextmanager
+    def span(self, name, labels=None, **attributes):
+        span = self.start_span(name, labels=labels, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _finish(self, span):
+        metric = span.name.replace(".", "_")
+        self.metrics.observe(f"{metric}_seconds", span.duration, **span.labels)
+        for attr in COUNTED_ATTRIBUTES:
+            value = span.attributes.get(attr)
+            if isinstance(value, (int, float)):
+                self.metrics.inc(f"{attr}_total", value, **span.labels)
+        price = self.prices.get(span.labels.get("model"))
+        if price and "input_tokens" in span.attributes:
+            cost = (span.attributes["input_tokens"] * price[0] + span.attributes.get("output_tokens", 0) * price[1]) / 1e6
+            span.attributes["cost_usd"] = cost
+            self.metrics.inc("cost_usd_total", cost, **span.labels)
+        if "cache" in span.attributes:
+            self.metrics.inc(f"{metric}_cache_total", result=span.attributes["cache"], **span.labels)
+
+        for exporter in self.exporters:
+            exporter.export_span(span)
+        for callback in self.on_span:
+            callback(span)
+
+    def log(self, message, level="INFO", **attributes):
+        span = _current_span.get()
+        record = {
+            "kind": "log",
+            "time_unix_nano": time.time_ns(),
+            "level": level,
+            "message": message,
+            "trace_id": span.trace_id if span else None,
+            "span_id": span.span_id if span else None,
+            "attributes": attributes,
+        }
+        for exporter in self.exporters:
+            exporter.export_log(record)
+
+
+def serve_prometheus(metrics: Metrics, port=9464, host="127.0.0.1"):
+    """Serve metrics.render_prometheus() at http://host:port/metrics from a daemon thread. Returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="pocket-agent-metrics", daemon=True).start()
+    return server
@@ -1,4 +1,5 @@
 import inspect, re, json
+from collections import deque
 
 def tool_to_string(func):
     sig = str(inspect.signature(func))        
@@ -16,38 +17,177 @@ def clean_json_response(msg: str):
             raise ValueError(f"No JSON found in message: {msg}")
 
 
-def _strip_code_fences(s: str) -> str:
-    s = re.sub(r'```(?:json)?\s*', '', s, flags=re.IGNORECASE)
-    s = s.replace('```', '')
-    return s.strip()
+_JSON_TOKENS = re.compile(r'[{}\[\]"\\\n]')
+_JSON_OPENERS = re.compile(r'[{\[]')
+_CLOSERS = {'}': '{', ']': '['}
 
-def find_next_start(s: str, idx: int) -> int:
-    p1 = s.find('{', idx)
-    p2 = s.find('[', idx)
-    if p1 == -1: return p2
-    if p2 == -1: return p1
-    return min(p1, p2)
+def _scan_spans(text: str, pos: int, spans: list):
+    """Scan text from pos tracking bracket depth and string state; returns the brackets left open."""
+    stack = []
+    in_string = False
+    skip = -1
 
-def extract_json_objects(text: str) :
-    text = _strip_code_fences(text)
+    for m in _JSON_TOKENS.finditer(text, pos):
+        i = m.start()
+        if i == skip:
+            continue
+        ch = text[i]
+
+        if not stack:
+            if ch == '{' or ch == '[':
+                stack.append((ch, i))
+            continue
+
+        if in_string:
+            if ch == '\\':
+                skip = i + 1
+            elif ch == '"' or ch == '\n':
+                # raw newlines are not valid inside JSON strings; the quote was stray
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch == '{' or ch == '[':
+            stack.append((ch, i))
+        elif ch in _CLOSERS and stack[-1][0] == _CLOSERS[ch]:
+            spans.append((stack.pop()[1], i + 1))
+
+    return stack
+
+def _balanced_spans(text: str, pos: int = 0):
+    """
+    Return (start, end) of every balanced {...} / [...] span in text, sorted outermost-first.
+    An opener that never closes (stray brace, truncated JSON) can throw string tracking off, so the text after
+    the innermost one is rescanned. Total rescanning is capped at a few passes' worth of text to stay O(n).
+    """
+    spans = []
+    budget = 4 * (len(text) - pos)
+
+    while True:
+        stack = _scan_spans(text, pos, spans)
+        budget -= len(text) - pos
+        if not stack or budget <= 0:
+            break
+        pos = stack[-1][1] + 1
+
+    spans.sort(key=lambda span: (span[0], -span[1]))
+    return spans
+
+def extract_json_objects(text: str, steps_only: bool = False):
+    """
+    Extract every top-level JSON object or array embedded in free text (code fences, prose, truncated output).
+    With steps_only, return only dicts that carry a "type" key; arrays of steps are flattened.
+    """
     decoder = json.JSONDecoder()
-    pos = 0
-    end = len(text)
     objs = []
 
+    # Fast path for well-formed output: decode object after object until the first failure.
+    pos = 0
     while True:
-        pos = find_next_start(text, pos)
-        if pos == -1:
+        m = _JSON_OPENERS.search(text, pos)
+        if not m:
+            pos = len(text)
+            break
+        try:
+            obj, pos = decoder.raw_decode(text, m.start())
+        except (ValueError, RecursionError):
+            pos = m.start()
             break
+        objs.append(obj)
 
+    # Everything after a malformed fragment goes through the linear scanner.
+    covered = 0
+    for start, end in _balanced_spans(text, pos):
+        if start < covered:
+            continue
         try:
-            obj, next_pos = decoder.raw_decode(text, pos)
-            objs.append(obj)
-            pos = next_pos 
-        except ValueError:
-            pos += 1
-            if pos >= end:
-                break
+            # decode a slice: JSONDecodeError counts newlines up to the error offset, which is O(n) on the full text
+            obj, _ = decoder.raw_decode(text[start:end])
+        except (ValueError, RecursionError):
+            # malformed: fall through to the spans nested inside it
+            continue
+        objs.append(obj)
+        covered = end
+
+    if steps_only:
+        steps = []
+        for obj in objs:
+            for item in (obj if isinstance(obj, list) else [obj]):
+                if isinstance(item, dict) and "type" in item:
+                    steps.append(item)
+        return steps
 
     return objs
 
+
+class JSONStepParser:
+    """
+    Incremental parser for streamed model output.
+    feed() returns every top-level JSON object completed by the chunk, as soon as its closing brace arrives.
+    A balanced candidate that is not valid JSON (a stray "{" in prose, say) is rescanned from its next "{".
+    A stray "{" that never closes hides everything after it from feed(); finish() recovers those steps at the end
+    of the stream, the same way extract_json_objects does.
+    """
+    def __init__(self):
+        self._buf = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _reset(self):
+        self._buf = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str):
+        objs = []
+        pending = deque(chunk)
+        while pending:
+            ch = pending.popleft()
+            if self._depth == 0:
+                if ch != '{':
+                    continue
+                self._buf = []
+
+            self._buf.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                elif ch == '\n':
+                    # raw newlines are not valid inside JSON strings; treat the quote as stray
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    text = ''.join(self._buf)
+                    try:
+                        obj = json.loads(text)
+                    except ValueError:
+                        # not JSON after all: the opening brace was stray, resume at the next one
+                        self._reset()
+                        restart = text.find('{', 1)
+                        if restart != -1:
+                            pending.extendleft(reversed(text[restart:]))
+                        continue
+                    if isinstance(obj, dict):
+                        objs.append(obj)
+        return objs
+
+    def finish(self):
+        """Steps in the text left open at the end of the stream (after an unmatched brace)."""
+        leftover = ''.join(self._buf) if self._depth > 0 else ''
+        self._reset()
+        return extract_json_objects(leftover, steps_only=True) if leftover else []
@@ -3,12 +3,18 @@ Minimal, secure MCP Filesystem Server (Python)
 
 Features:
 - Exposes a small set of filesystem "tools" to an MCP host:
-  - list_dir(path)
-  - read_file(path, max_bytes=...)
+  - list_dir(path, depth=..., pattern=..., page=..., page_size=...)
+  - read_file(path, max_bytes=..., offset=...)  (mmap-backed ranged reads, paginated via next_offset)
+  - read_lines(path, start_line=..., num_lines=...)  (line ranges via a cached line-offset index)
   - stat(path)
-  - search(path, query, max_results=...)
+  - stat_many(paths), read_many(paths, max_bytes=...)  (batched, served from a thread pool)
+  - search(path, query, max_results=..., max_depth=...)
+  - grep(query, path, page=..., page_size=...)  (ranked full-text search)
 - Safe by default: all paths are rooted under a configured root directory, preventing path traversal.
 - Read-size limits and read-only by default; you can extend to write/delete with care.
+- Filename and full-text search are served from an in-memory index that is refreshed incrementally
+  in a background thread (an mtime scan, at most every MCP_FS_INDEX_REFRESH seconds) instead of walking
+  the tree per call.
 
 Usage (development):
     pip install mcp-server
@@ -22,8 +28,19 @@ connects (for example an LLM host). Only run this server in trusted environments
 restrict the `ROOT_DIR` to a safe directory.
 """
 
+from array import array
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from stat import S_ISDIR
+import base64
+import fnmatch
+import math
+import mmap
 import os
+import re
+import threading
+import time
 import typing as t
 
 try:
@@ -37,6 +54,11 @@ except Exception as e:
 ROOT_DIR = Path(os.environ.get("MCP_FS_ROOT", "."))  # root of allowed filesystem access
 READ_LIMIT_BYTES = int(os.environ.get("MCP_FS_READ_LIMIT", "200000"))  # 200 KB default
 NAME = "Filesystem"
+TRANSPORT = os.environ.get("MCP_FS_TRANSPORT", "stdio")  # or "streamable-http" to serve on a local port
+INDEX_REFRESH_SECONDS = float(os.environ.get("MCP_FS_INDEX_REFRESH", "2"))  # min interval between mtime scans
+INDEX_MAX_FILE_BYTES = int(os.environ.get("MCP_FS_INDEX_MAX_FILE", "1000000"))  # larger files are not content-indexed
+INDEX_BATCH_FILES = 256  # changed files applied to the index per lock acquisition during a scan
+INDEX_SKIP_DIRS = {".git", "__pycache__", "node_modules", ".venv"}  # not content-indexed (names still are)
 
 mcp = FastMCP(NAME)
 
@@ -57,25 +79,289 @@ def _resolve_path(user_path: str) -> Path:
     return p
 
 
+_TOKEN = re.compile(r"[A-Za-z0-9_]+")
+
+
+def _tokens(text: str) -> t.List[str]:
+    return [tok.lower() for tok in _TOKEN.findall(text)]
+
+
+class FileIndex:
+    """
+    In-memory index of every file under a root: names for filename search, plus an inverted index
+    (token -> {file: count}) of small text files for full-text search.
+
+    refresh() rescans the tree with os.scandir and re-reads only files whose mtime or size changed. Queries never
+    wait for a rescan (except the very first build): a stale index starts one in the background and the query is
+    answered from the current snapshot.
+    """
+    def __init__(self, root: Path):
+        self.root = root
+        self.files: t.Dict[str, t.Tuple[int, int]] = {}  # relative posix path -> (mtime_ns, size)
+        self.postings: t.Dict[str, t.Dict[str, int]] = defaultdict(dict)
+        self.file_tokens: t.Dict[str, t.Set[str]] = {}
+        self.lock = threading.Lock()  # guards files / postings / file_tokens
+        self.refresh_lock = threading.Lock()  # one scan at a time
+        self.last_refresh = 0.0
+        self.stats: t.Dict[str, t.Any] = {"builds": 0, "queries": 0, "query_seconds_total": 0.0}
+
+    def refresh(self, force: bool = False):
+        with self.refresh_lock:
+            if not force and time.monotonic() - self.last_refresh < INDEX_REFRESH_SECONDS:
+                return
+            started = time.perf_counter()
+            seen = set()
+            changed = 0
+            pending = []
+
+            # the scan and file reads run without self.lock, so queries keep being served; self.files is only
+            # written by the scan itself (under self.lock, in batches)
+            stack = [(self.root, "", False)]
+            while stack:
+                directory, prefix, skip_content = stack.pop()
+                try:
+                    entries = list(os.scandir(directory))
+                except OSError:
+                    continue
+                for entry in entries:
+                    rel = prefix + entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, rel + "/", skip_content or entry.name in INDEX_SKIP_DIRS))
+                            continue
+                        # symlinks are skipped: one pointing outside the root would leak its target through grep
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    seen.add(rel)
+                    key = (st.st_mtime_ns, st.st_size)
+                    if self.files.get(rel) != key:
+                        pending.append((rel, key, self._read_tokens(entry.path, st.st_size, skip_content)))
+                        changed += 1
+                        if len(pending) >= INDEX_BATCH_FILES:
+                            self._apply(pending)
+                            pending = []
+
+            with self.lock:
+                self._apply_locked(pending)
+                for rel in self.files.keys() - seen:
+                    del self.files[rel]
+                    self._drop_content(rel)
+                    changed += 1
+
+            self.last_refresh = time.monotonic()
+            self.stats["builds"] += 1
+            self.stats["last_build_seconds"] = round(time.perf_counter() - started, 6)
+            self.stats["last_build_changed_files"] = changed
+
+    def refresh_in_background(self):
+        """Called by queries: the first build is waited for, later rescans run in a daemon thread."""
+        if self.last_refresh == 0.0:
+            self.refresh()
+        elif time.monotonic() - self.last_refresh >= INDEX_REFRESH_SECONDS and not self.refresh_lock.locked():
+            threading.Thread(target=self.refresh, name="fs-index-refresh", daemon=True).start()
+
+    def _apply(self, pending):
+        with self.lock:
+            self._apply_locked(pending)
+
+    def _apply_locked(self, pending):
+        for rel, key, counts in pending:
+            self.files[rel] = key
+            self._drop_content(rel)
+            if counts is None:
+                continue
+            for tok, count in counts.items():
+                self.postings[tok][rel] = count
+            self.file_tokens[rel] = set(counts)
+
+    def _drop_content(self, rel: str):
+        for tok in self.file_tokens.pop(rel, ()):
+            files = self.postings.get(tok)
+            if files is not None:
+                files.pop(rel, None)
+                if not files:
+                    del self.postings[tok]
+
+    @staticmethod
+    def _read_tokens(full_path: str, size: int, skip: bool) -> t.Optional[t.Dict[str, int]]:
+        """Token counts of a text file, or None if its content is not indexed."""
+        if skip or size > INDEX_MAX_FILE_BYTES:
+            return None
+        try:
+            with open(full_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if b"\0" in data[:8192]:
+            return None  # binary
+
+        counts: t.Dict[str, int] = defaultdict(int)
+        for tok in _tokens(data.decode("utf-8", errors="replace")):
+            counts[tok] += 1
+        return counts
+
+    def _record_query(self, started: float):
+        elapsed = time.perf_counter() - started
+        self.stats["queries"] += 1
+        self.stats["query_seconds_total"] += elapsed
+        self.stats["last_query_seconds"] = round(elapsed, 6)
+
+    def find_names(self, prefix: str, query: str, max_results: int, max_depth: t.Optional[int]):
+        """Files under prefix whose name contains query (case-insensitive). Returns (matches, truncated)."""
+        self.refresh_in_background()
+        started = time.perf_counter()
+        q_lower = query.lower()
+        base_depth = prefix.count("/")
+        matches = []
+        truncated = False
+        with self.lock:
+            for rel in self.files:
+                if not rel.startswith(prefix):
+                    continue
+                if max_depth is not None and rel.count("/") - base_depth >= max_depth:
+                    continue
+                if q_lower in rel.rsplit("/", 1)[-1].lower():
+                    if len(matches) >= max_results:
+                        truncated = True
+                        break
+                    matches.append(rel)
+        self._record_query(started)
+        return matches, truncated
+
+    def search_content(self, prefix: str, query: str):
+        """Files under prefix containing every token of query, ranked by tf-idf. Returns [(rel, score)]."""
+        self.refresh_in_background()
+        started = time.perf_counter()
+        terms = set(_tokens(query))
+        ranked = []
+        with self.lock:
+            postings = [self.postings.get(term, {}) for term in terms]
+            if postings and all(postings):
+                postings.sort(key=len)
+                total = max(len(self.file_tokens), 1)
+                for rel in postings[0]:
+                    if not rel.startswith(prefix) or not all(rel in p for p in postings[1:]):
+                        continue
+                    score = sum((1 + math.log(p[rel])) * math.log(1 + total / len(p)) for p in postings)
+                    ranked.append((rel, round(score, 4)))
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        self._record_query(started)
+        return ranked
+
+    def summary(self) -> t.Dict[str, t.Any]:
+        queries = self.stats["queries"]
+        return {
+            "files": len(self.files),
+            "content_indexed_files": len(self.file_tokens),
+            "tokens": len(self.postings),
+            "builds": self.stats["builds"],
+            "last_build_seconds": self.stats.get("last_build_seconds"),
+            "last_build_changed_files": self.stats.get("last_build_changed_files"),
+            "queries": queries,
+            "last_query_seconds": self.stats.get("last_query_seconds"),
+            "avg_query_seconds": round(self.stats["query_seconds_total"] / queries, 6) if queries else None,
+        }
+
+
+def _root_resolved() -> Path:
+    try:
+        return ROOT_DIR.resolve()
+    except Exception:
+        return ROOT_DIR
+
+
+_index = FileIndex(_root_resolved())
+
+
+def _index_prefix(p: Path) -> str:
+    """Relative posix prefix of a resolved directory inside the index ("" for the root)."""
+    rel = p.relative_to(_index.root).as_posix()
+    return "" if rel == "." else rel + "/"
+
+
+LIST_DIR_MAX_ENTRIES = 100000  # hard cap on entries collected by one (recursive) list_dir
+BATCH_MAX_PATHS = 100
+_io_pool = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4), thread_name_prefix="fs-batch")
+
+
 @mcp.tool()
-def list_dir(path: str = "") -> t.Dict[str, t.Any]:
+def list_dir(path: str = "", depth: int = 1, pattern: str = "", page: int = 1, page_size: int = 200) -> t.Dict[str, t.Any]:
     """
-    List directory contents. Returns a dict with 'entries' (list of name/type) and 'path'.
+    List directory contents, sorted by name. Returns {'path', 'entries' (name/is_dir/size), 'total', 'page', 'has_more'}.
+    depth > 1 recurses into subdirectories (names are then relative paths); pattern is a glob on the entry name
+    (e.g. "*.py"). Results are paginated with page / page_size.
     """
     p = _resolve_path(path)
     if not p.exists():
         return {"error": "not_found", "path": str(p)}
     if not p.is_dir():
         return {"error": "not_a_directory", "path": str(p)}
+    if depth <= 0:
+        return {"error": "invalid_depth"}
+    if page <= 0 or page_size <= 0:
+        return {"error": "invalid_page"}
 
     entries = []
-    for child in sorted(p.iterdir(), key=lambda x: x.name):
-        entries.append({
-            "name": child.name,
-            "is_dir": child.is_dir(),
-            "size": child.stat().st_size if child.is_file() else None,
-        })
-    return {"path": str(p), "entries": entries}
+    truncated = False
+    stack = [(str(p), "", 1)]
+    while stack and not truncated:
+        directory, prefix, level = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                children = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        subdirs = []
+        for child in children:
+            try:
+                # scandir caches the dirent type, so only regular files cost a stat() (for their size)
+                is_dir = child.is_dir()
+                size = child.stat().st_size if not is_dir and child.is_file() else None
+            except OSError:
+                continue
+            if not pattern or fnmatch.fnmatch(child.name, pattern):
+                entries.append({"name": prefix + child.name, "is_dir": is_dir, "size": size})
+                if len(entries) >= LIST_DIR_MAX_ENTRIES:
+                    truncated = True
+                    break
+            if is_dir and level < depth and not child.is_symlink():
+                subdirs.append((child.path, prefix + child.name + "/", level + 1))
+        stack.extend(reversed(subdirs))
+
+    if depth > 1:
+        entries.sort(key=lambda e: e["name"])
+    start = (page - 1) * page_size
+    return {
+        "path": str(p),
+        "entries": entries[start:start + page_size],
+        "total": len(entries),
+        "page": page,
+        "has_more": start + page_size < len(entries),
+        "truncated": truncated,
+    }
+
+
+def _stat(path: str) -> t.Dict[str, t.Any]:
+    try:
+        p = _resolve_path(path)
+        st = p.stat()
+    except ValueError:
+        return {"error": "outside_root", "path": path}
+    except FileNotFoundError:
+        return {"error": "not_found", "path": str(p)}
+    except OSError as e:
+        return {"error": "stat_failed", "path": path, "reason": str(e)}
+    return {
+        "path": str(p),
+        "is_dir": S_ISDIR(st.st_mode),
+        "size": st.st_size,
+        "mtime": int(st.st_mtime),
+        "ctime": int(st.st_ctime),
+    }
 
 
 @mcp.tool()
@@ -83,27 +369,96 @@ def stat(path: str) -> t.Dict[str, t.Any]:
     """
     Return basic stat info for a file or directory.
     """
-    p = _resolve_path(path)
-    if not p.exists():
-        return {"error": "not_found", "path": str(p)}
-    st = p.stat()
+    return _stat(path)
+
+
+@mcp.tool()
+def stat_many(paths: t.List[str]) -> t.Dict[str, t.Any]:
+    """
+    stat for up to BATCH_MAX_PATHS paths in one call. Returns {'results': [...]} in the order given.
+    """
+    if len(paths) > BATCH_MAX_PATHS:
+        return {"error": "too_many_paths", "max": BATCH_MAX_PATHS}
+    return {"results": list(_io_pool.map(_stat, paths))}
+
+
+BINARY_SAMPLE_BYTES = 8192
+LINE_CHECKPOINT_EVERY = 1024  # the line-offset index keeps the byte offset of every Nth line
+LINE_INDEX_CACHE_SIZE = 32
+
+
+def _is_binary(mm) -> bool:
+    """Sample a small prefix instead of attempting to decode the whole file."""
+    sample = mm[:BINARY_SAMPLE_BYTES]
+    if b"\0" in sample:
+        return True
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # a multi-byte character cut by the sample boundary is fine
+        return e.start < len(sample) - 3
+    return False
+
+
+def _utf8_start(mm, pos: int, end: int) -> int:
+    """Move pos forward past UTF-8 continuation bytes so a window never starts mid-character."""
+    limit = min(pos + 3, end)
+    while pos < limit and (mm[pos] & 0xC0) == 0x80:
+        pos += 1
+    return pos
+
+
+def _utf8_end(mm, start: int, end: int, size: int) -> int:
+    """Move end back so a window never ends mid-character (unless it is the end of the file)."""
+    if end >= size:
+        return end
+    cut = end
+    while cut > start and end - cut < 3 and (mm[cut] & 0xC0) == 0x80:
+        cut -= 1
+    return cut if cut > start else end
+
+
+def _window(p: Path, offset: int, length: int) -> t.Dict[str, t.Any]:
+    size = p.stat().st_size
+    if size == 0 or offset >= size:
+        return {"path": str(p), "content": "", "encoding": "utf-8", "offset": offset, "size": size,
+                "next_offset": None, "truncated": False}
+
+    with p.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        binary = _is_binary(mm)
+        start = offset if binary else _utf8_start(mm, offset, size)
+        end = min(start + length, size)
+        if not binary:
+            end = _utf8_end(mm, start, end, size)
+        data = mm[start:end]
+
+    if binary:
+        content, encoding = base64.b64encode(data).decode("ascii"), "base64"
+    else:
+        content, encoding = data.decode("utf-8", errors="replace"), "utf-8"
+
     return {
         "path": str(p),
-        "is_dir": p.is_dir(),
-        "size": st.st_size,
-        "mtime": int(st.st_mtime),
-        "ctime": int(st.st_ctime),
+        "content": content,
+        "encoding": encoding,
+        "offset": start,
+        "size": size,
+        "next_offset": end if end < size else None,
+        "truncated": end < size,
     }
 
 
 @mcp.tool()
-def read_file(path: str, max_bytes: int = READ_LIMIT_BYTES) -> t.Dict[str, t.Any]:
+def read_file(path: str, max_bytes: int = READ_LIMIT_BYTES, offset: int = 0) -> t.Dict[str, t.Any]:
     """
-    Read up to max_bytes from a file and return as UTF-8 string if possible.
-    Returns {'path':..., 'content':..., 'truncated': bool} or error dict.
+    Read up to max_bytes starting at byte offset, as UTF-8 text (or base64 for binary files).
+    Returns {'path', 'content', 'encoding', 'offset', 'size', 'next_offset', 'truncated'} or error dict.
+    To page through a large file, call again with offset=next_offset until next_offset is null.
     """
     if max_bytes <= 0:
         return {"error": "invalid_max_bytes"}
+    if offset < 0:
+        return {"error": "invalid_offset"}
     max_bytes = min(max_bytes, READ_LIMIT_BYTES)
 
     p = _resolve_path(path)
@@ -111,30 +466,155 @@ def read_file(path: str, max_bytes: int = READ_LIMIT_BYTES) -> t.Dict[str, t.Any
         return {"error": "not_found_or_not_file", "path": str(p)}
 
     try:
-        with p.open("rb") as f:
-            data = f.read(max_bytes + 1)
+        return _window(p, offset, max_bytes)
     except Exception as e:
         return {"error": "read_failed", "reason": str(e)}
 
-    truncated = len(data) > max_bytes
-    if truncated:
-        data = data[:max_bytes]
 
-    # Try to decode as utf-8; if fails, return base64 to avoid data loss
+def _read_one(path: str, max_bytes: int) -> t.Dict[str, t.Any]:
     try:
-        text = data.decode("utf-8")
-        return {"path": str(p), "content": text, "truncated": truncated, "encoding": "utf-8"}
-    except Exception:
-        import base64
+        return read_file(path, max_bytes)
+    except ValueError:
+        return {"error": "outside_root", "path": path}
+
 
-        b64 = base64.b64encode(data).decode("ascii")
-        return {"path": str(p), "content": b64, "truncated": truncated, "encoding": "base64"}
+@mcp.tool()
+def read_many(paths: t.List[str], max_bytes: int = READ_LIMIT_BYTES) -> t.Dict[str, t.Any]:
+    """
+    read_file for up to BATCH_MAX_PATHS paths in one call. READ_LIMIT_BYTES is shared across the batch, so each
+    file gets at most max_bytes and at most its share of the limit. Returns {'results': [...]} in the order given;
+    page through a truncated file with read_file(offset=next_offset).
+    """
+    if not paths:
+        return {"results": []}
+    if len(paths) > BATCH_MAX_PATHS:
+        return {"error": "too_many_paths", "max": BATCH_MAX_PATHS}
+    per_file = max(1, min(max_bytes, READ_LIMIT_BYTES // len(paths)))
+    return {"results": list(_io_pool.map(lambda path: _read_one(path, per_file), paths))}
+
+
+class _LineIndex:
+    """
+    Sparse line-offset index of one file, built lazily: only as far as the furthest line requested so far.
+    checkpoints[i] is the byte offset where line i * LINE_CHECKPOINT_EVERY starts (0-based).
+    """
+    def __init__(self, key):
+        self.key = key  # (mtime_ns, size) the index was built for
+        self.checkpoints = array("Q", [0])
+        self.scanned_pos = 0
+        self.scanned_lines = 0
+        self.eof = False
+
+    def _extend(self, mm, line: int):
+        pos, count = self.scanned_pos, self.scanned_lines
+        while count < line and not self.eof:
+            nl = mm.find(b"\n", pos)
+            if nl == -1:
+                self.eof = True
+                break
+            pos = nl + 1
+            count += 1
+            if count % LINE_CHECKPOINT_EVERY == 0:
+                self.checkpoints.append(pos)
+        self.scanned_pos, self.scanned_lines = pos, count
+
+    def offset_of(self, mm, line: int) -> t.Optional[int]:
+        """Byte offset where 0-based line starts, or None past the end of the file."""
+        self._extend(mm, line)
+        if line > self.scanned_lines or (line == self.scanned_lines and self.scanned_pos >= len(mm)):
+            return None
+        pos = self.checkpoints[line // LINE_CHECKPOINT_EVERY]
+        for _ in range(line % LINE_CHECKPOINT_EVERY):
+            pos = mm.find(b"\n", pos) + 1
+        return pos
+
+
+_line_indexes: "OrderedDict[str, _LineIndex]" = OrderedDict()
+_line_indexes_lock = threading.Lock()
+
+
+def _line_index(p: Path, st) -> _LineIndex:
+    key = (st.st_mtime_ns, st.st_size)
+    index = _line_indexes.get(str(p))
+    if index is None or index.key != key:
+        index = _LineIndex(key)
+        _line_indexes[str(p)] = index
+    _line_indexes.move_to_end(str(p))
+    while len(_line_indexes) > LINE_INDEX_CACHE_SIZE:
+        _line_indexes.popitem(last=False)
+    return index
 
 
 @mcp.tool()
-def search(path: str = "", query: str = "", max_results: int = 25) -> t.Dict[str, t.Any]:
+def read_lines(path: str, start_line: int = 1, num_lines: int = 200) -> t.Dict[str, t.Any]:
     """
-    Simple filename search (not full-text). Walks the directory tree (bounded) and returns matching file paths.
+    Read num_lines lines of a text file starting at start_line (1-based), capped at READ_LIMIT_BYTES.
+    Returns {'path', 'start_line', 'end_line', 'content', 'next_line', 'next_offset', 'truncated'}; next_line is null
+    at end of file. If truncated, next_offset is the byte offset where content stops: a single line longer than
+    READ_LIMIT_BYTES is only cut ('line_cut': true), next_line moves past it and read_file(offset=next_offset)
+    reads the rest of it.
+    """
+    if start_line <= 0 or num_lines <= 0:
+        return {"error": "invalid_line_range"}
+
+    p = _resolve_path(path)
+    if not p.exists() or not p.is_file():
+        return {"error": "not_found_or_not_file", "path": str(p)}
+
+    try:
+        st = p.stat()
+        if st.st_size == 0:
+            return {"error": "start_line_past_end", "path": str(p)}
+        with p.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if _is_binary(mm):
+                return {"error": "binary_file", "path": str(p)}
+            with _line_indexes_lock:
+                index = _line_index(p, st)
+                start = index.offset_of(mm, start_line - 1)
+                end = index.offset_of(mm, start_line - 1 + num_lines) if start is not None else None
+            if start is None:
+                return {"error": "start_line_past_end", "path": str(p)}
+
+            stop = st.st_size if end is None else end
+            truncated = stop - start > READ_LIMIT_BYTES
+            if truncated:
+                stop = _utf8_end(mm, start, start + READ_LIMIT_BYTES, st.st_size)
+            data = mm[start:stop]
+            complete = data.count(b"\n")
+            line_cut = truncated and complete == 0
+            if line_cut:
+                # the first line alone is over the limit: resuming at it would return the same chunk forever
+                has_next = mm.find(b"\n", stop) not in (-1, st.st_size - 1)
+    except Exception as e:
+        return {"error": "read_failed", "reason": str(e)}
+
+    lines_read = complete + (1 if data and not data.endswith(b"\n") else 0)
+    if line_cut:
+        next_line = start_line + 1 if has_next else None
+    elif truncated:
+        next_line = start_line + complete  # resume at the line that was cut off
+    else:
+        next_line = start_line + num_lines if end is not None else None
+
+    result = {
+        "path": str(p),
+        "start_line": start_line,
+        "end_line": start_line + lines_read - 1,
+        "content": data.decode("utf-8", errors="replace"),
+        "next_line": next_line,
+        "next_offset": start + len(data) if truncated else None,
+        "truncated": truncated,
+    }
+    if line_cut:
+        result["line_cut"] = True
+    return result
+
+
+@mcp.tool()
+def search(path: str = "", query: str = "", max_results: int = 25, max_depth: t.Optional[int] = None) -> t.Dict[str, t.Any]:
+    """
+    Filename search (not full-text; see grep). Returns file paths under path whose name contains query.
+    max_depth limits how many directories deep below path to look (1 = only files directly in path).
     """
     p = _resolve_path(path)
     if not p.exists() or not p.is_dir():
@@ -142,18 +622,54 @@ def search(path: str = "", query: str = "", max_results: int = 25) -> t.Dict[str
 
     if max_results <= 0:
         return {"error": "invalid_max_results"}
-    matches = []
-    q_lower = query.lower()
-    # Walk but limit depth/number of entries to avoid DoS
-    for root, dirs, files in os.walk(p):
-        # optionally limit depth by comparing Path parts
-        for fname in files:
-            if q_lower in fname.lower():
-                full = Path(root) / fname
-                matches.append(str(full))
-                if len(matches) >= max_results:
-                    return {"path": str(p), "matches": matches, "truncated": True}
-    return {"path": str(p), "matches": matches, "truncated": False}
+    if max_depth is not None and max_depth <= 0:
+        return {"error": "invalid_max_depth"}
+
+    matches, truncated = _index.find_names(_index_prefix(p), query, max_results, max_depth)
+    return {"path": str(p), "matches": [str(_index.root / rel) for rel in matches], "truncated": truncated}
+
+
+@mcp.tool()
+def grep(query: str, path: str = "", page: int = 1, page_size: int = 10, max_lines: int = 5) -> t.Dict[str, t.Any]:
+    """
+    Full-text search over text files under path. Files containing every word of query are ranked by relevance
+    (tf-idf) and returned a page at a time, each with up to max_lines matching lines.
+    """
+    p = _resolve_path(path)
+    if not p.exists() or not p.is_dir():
+        return {"error": "not_found_or_not_dir", "path": str(p)}
+    if page <= 0 or page_size <= 0:
+        return {"error": "invalid_page"}
+    if not _tokens(query):
+        return {"error": "empty_query"}
+
+    ranked = _index.search_content(_index_prefix(p), query)
+    start = (page - 1) * page_size
+    terms = set(_tokens(query))
+    results = []
+    for rel, score in ranked[start:start + page_size]:
+        lines = []
+        try:
+            # the index may be stale: re-check that the file still resolves inside the root
+            full = _resolve_path(str(_index.root / rel))
+            with open(full, encoding="utf-8", errors="replace") as f:
+                for lineno, line in enumerate(f, 1):
+                    if terms & set(_tokens(line)):
+                        lines.append({"line": lineno, "text": line.rstrip("\n")[:300]})
+                        if len(lines) >= max_lines:
+                            break
+        except (OSError, ValueError):
+            continue
+        results.append({"path": str(_index.root / rel), "score": score, "lines": lines})
+
+    return {
+        "query": query,
+        "total": len(ranked),
+        "page": page,
+        "page_size": page_size,
+        "has_more": start + page_size < len(ranked),
+        "results": results,
+    }
 
 
 # Additional metadata resource to advertise server capabilities
@@ -162,12 +678,15 @@ def capabilities():
     return {
         "name": NAME,
         "description": "Filesystem access (read-only) with path-rooting and size limits",
-        "tools": ["list_dir", "stat", "read_file", "search"],
+        "tools": ["list_dir", "stat", "stat_many", "read_file", "read_many", "read_lines", "search", "grep"],
         "root": str(ROOT_DIR.resolve()),
         "read_limit_bytes": READ_LIMIT_BYTES,
+        "index": _index.summary(),
     }
 
 
 if __name__ == "__main__":
     print(f"Starting MCP Filesystem server for root: {ROOT_DIR.resolve()}")
-    mcp.run(transport="stdio")
+    # warm the index in the background so the first search doesn't pay for the full build
+    threading.Thread(target=_index.refresh, kwargs={"force": True}, daemon=True).start()
+    mcp.run(transport=TRANSPORT)
@@ -5,8 +5,9 @@ load_dotenv()
 
 from pocket_agent.llm import MistralLLM, GenaiLLM, CoherelLLM
 from pocket_agent.agent import Agent
-from tools import http_get
-from pocket_agent.mcp_client import MCPClient
+from tools import http_get, aclose as close_http
+from pocket_agent.mcp_pool import MCPPool
+from pocket_agent.session import AgentSession
 
 
 # llm = GenaiLLM(os.getenv("GEMINI_API_KEY"))
@@ -14,7 +15,7 @@ from pocket_agent.mcp_client import MCPClient
 llm = CoherelLLM(api_key=os.getenv("COHERE_API_KEY"))
 agent = Agent(llm=llm)
 
-@agent.register_tool
+@agent.register_tool(mode="process", timeout=5)
 def calculator(expression: str) -> int:
     """
     Evaluate a math expression and return the result.
@@ -33,9 +34,10 @@ agent.register_tool(http_get)
 
 
 async def main():
-    file_system_mcp = MCPClient()
-    await file_system_mcp.connect_to_local_server("server.py")
-    agent.register_mcp(file_system_mcp)
+    mcp_pool = MCPPool()
+    await mcp_pool.add_server("fs", "server.py", replicas=2, lazy=True)
+    agent.register_mcp(mcp_pool)
+    session = AgentSession()
 
     try:
         while True:
@@ -43,10 +45,11 @@ async def main():
             if prompt:
                 if prompt in ["thanks", "exit", "tq"]:
                     break
-                output = await agent.ainvoke(prompt, True)
+                output = await agent.ainvoke(prompt, True, session=session)
                 print(f"@ {output}")
     finally:
-        await file_system_mcp.close()
+        await mcp_pool.close()
+        await close_http()
         print("🔌 MCP connection closed.")
 
 
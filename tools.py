@@ -1,6 +1,53 @@
-import requests
+import os
+import json
+import asyncio
+from urllib.parse import urlsplit
 
-def http_get(url: str, params: dict = None):
+MAX_BODY_BYTES = int(os.environ.get("HTTP_GET_MAX_BYTES", "1000000"))  # 1 MB default
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_GET_MAX_PER_HOST", "10"))
+TIMEOUT = 10
+
+# One pooled client per event loop, shared by every http_get call on it (keep-alive, optional HTTP/2).
+_client = None
+_client_loop = None
+_host_limits = {}
+
+
+def _get_client():
+    global _client, _client_loop, _host_limits
+
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        try:
+            import httpx
+        except Exception:
+            raise ImportError("httpx not found. Install it with `pip install httpx` (`pip install httpx[http2]` for HTTP/2).")
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+
+        _client = httpx.AsyncClient(
+            http2=http2,
+            timeout=TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+        )
+        _client_loop = loop
+        _host_limits = {}
+    return _client
+
+
+async def aclose():
+    """Close the shared HTTP client."""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+        _client, _client_loop = None, None
+
+
+async def http_get(url: str, params: dict = None):
     """
     Send an HTTP GET request.
 
@@ -8,17 +55,35 @@ def http_get(url: str, params: dict = None):
         dict: A dictionary containing:
             - "status_code" (int): The HTTP response status code.
             - "result" (str): The raw response body as text or parsed JSON response if the response is JSON, else None.
+            - "truncated" (bool): True if the body was cut at the size limit (it is then returned as text).
 
     Raises:
-        requests.RequestException: If the request fails (e.g., timeout, connection error).
+        httpx.HTTPError: If the request fails (e.g., timeout, connection error).
     """
-    try:
-        response = requests.get(url, params=params, timeout=10)
+    client = _get_client()
+    limit = _host_limits.setdefault(urlsplit(url).netloc, asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST))
+
+    async with limit:
+        async with client.stream("GET", url, params=params) as response:
+            body = bytearray()
+            truncated = False
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > MAX_BODY_BYTES:
+                    del body[MAX_BODY_BYTES:]
+                    truncated = True
+                    break
 
-        return {
-            "status_code": response.status_code,
-            "result": (response.json() if "application/json" in response.headers.get("Content-Type", "") else response.text)
-        }
+            text = body.decode(response.encoding or "utf-8", errors="replace")
+            result = text
+            if not truncated and "application/json" in response.headers.get("Content-Type", ""):
+                try:
+                    result = json.loads(text)
+                except ValueError:
+                    pass
 
-    except requests.RequestException as e:
-        raise e
+            return {
+                "status_code": response.status_code,
+                "result": result,
+                "truncated": truncated,
+            }